@@ -1,7 +1,12 @@
 import sys
 import os
+import hashlib
+import json
 import paramiko
+import queue
 import socket
+import threading
+import time
 from stat import S_ISDIR
 from getpass import getpass
 from tqdm import tqdm
@@ -9,6 +14,29 @@ from tqdm import tqdm
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from banner import print_banner
 
+# --- Settings ---
+# Parallel SFTP channels opened over the SSH connection (1 = one file at a time)
+SFTP_CHANNELS = 8
+
+# Local manifest of what was uploaded, so later runs don't walk the remote tree
+SYNC_MANIFEST = True
+MANIFEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Manifests")
+
+# True: hash every file on each run, and check once against the server the files the first
+# run only matched by size; False: only files whose size or mtime changed, size matches trusted
+STRONG_HASH = False
+
+# Check of a size-matched remote file when the server can't hash it: N pieces read back and compared
+VERIFY_SAMPLES = 16
+VERIFY_SAMPLE_SIZE = 64 * 1024
+
+# Reuse the remote listing of a previous run for N hours when there is no manifest (0 = always scan)
+LISTING_CACHE_HOURS = 0
+
+# Files of at least this size that exist remotely only get their changed blocks rewritten (0 = off)
+DELTA_THRESHOLD = 64 * 1024 * 1024
+DELTA_BLOCK_SIZE = 1024 * 1024
+
 # --- Log colors ---
 class LogColors:
     RED = "\033[1;91m"
@@ -20,22 +48,260 @@ class LogColors:
 def format_log(tag, message, color):
     print(f"{color}{tag}{LogColors.RESET} {message}")
 
-# --- Remote file listing ---
-def list_remote_files(sftp, remote_dir):
+# --- Extra SFTP channels over the SSH connection of the main one ---
+def open_channels(sftp, channels):
+    transport = sftp.get_channel().get_transport()
+    return [sftp] + [paramiko.SFTPClient.from_transport(transport) for _ in range(channels - 1)]
+
+# --- Remote file listing: breadth-first, one directory request in flight per channel ---
+def list_worker(sftp, folders, files, lock):
+    while True:
+        folder = folders.get()
+        if folder is None:
+            return
+        try:
+            for entry in sftp.listdir_attr(folder):
+                remote_path = f"{folder}/{entry.filename}"
+                if S_ISDIR(entry.st_mode):
+                    folders.put(remote_path)
+                else:
+                    with lock:
+                        files[remote_path] = entry.st_size
+        except FileNotFoundError:
+            pass
+        except (IOError, paramiko.SSHException) as e:
+            format_log("[ERROR]", f"Cannot list {folder}: {e}", LogColors.RED)
+        finally:
+            folders.task_done()
+
+def list_remote_files(sftp, remote_dir, channels=SFTP_CHANNELS):
     files = {}
-    try:
-        for entry in sftp.listdir_attr(remote_dir):
-            remote_path = f"{remote_dir}/{entry.filename}"
-            if S_ISDIR(entry.st_mode):
-                files.update(list_remote_files(sftp, remote_path))
-            else:
-                files[remote_path] = entry.st_size
-    except FileNotFoundError:
-        pass
+    folders = queue.Queue()
+    folders.put(remote_dir)
+    lock = threading.Lock()
+
+    clients = open_channels(sftp, max(1, channels))
+    workers = [threading.Thread(target=list_worker, args=(client, folders, files, lock), daemon=True) for client in clients]
+    for worker in workers:
+        worker.start()
+    # Every folder found is queued before its parent is done, so join() waits for the whole tree
+    folders.join()
+    for _ in workers:
+        folders.put(None)
+    for worker in workers:
+        worker.join()
+    for client in clients[1:]:
+        client.close()
     return files
 
+# --- Remote listing cache ---
+def load_listing_cache(path, max_age_hours):
+    if not path or max_age_hours <= 0 or not os.path.exists(path):
+        return None
+    if time.time() - os.path.getmtime(path) > max_age_hours * 3600:
+        return None
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def save_listing_cache(path, remote_files):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(remote_files, file)
+    os.replace(tmp_path, path)
+
+# --- Sync manifest (rsync-style quick check) ---
+def manifest_path_for(host, remote_dir, suffix=".json"):
+    target = f"{host}:{remote_dir}"
+    return os.path.join(MANIFEST_DIR, hashlib.sha256(target.encode()).hexdigest()[:16] + suffix)
+
+def load_manifest(path):
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as file:
+            return json.load(file)["files"]
+    except (OSError, ValueError, KeyError):
+        format_log("[WARN]", f"Unreadable sync manifest {path}, walking the remote tree.", LogColors.RED)
+        return None
+
+def save_manifest(path, remote_dir, files):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump({"remote_dir": remote_dir, "files": files}, file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def file_hash(path, chunk_size=1024 * 1024):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def hash_entry(local_path, entry, delta_threshold):
+    """Sets the content hash of entry, with its block hashes for delta-sized files (one read)."""
+    if delta_threshold and entry["size"] >= delta_threshold:
+        entry["hash"], entry["blocks"] = file_hashes(local_path)
+    else:
+        entry["hash"] = file_hash(local_path)
+
+def is_unchanged(local_path, entry, known, strong_hash, delta_threshold):
+    """Quick check against the manifest; entry is refreshed with size, mtime and hash."""
+    if (known and known.get("hash") and not strong_hash
+            and known["size"] == entry["size"] and known["mtime"] == entry["mtime"]):
+        entry["hash"] = known.get("hash")
+        carry_blocks(entry, known)
+        return True
+    hash_entry(local_path, entry, delta_threshold)
+    # Same content under a new mtime (touch, checkout) is not uploaded again
+    return bool(known) and known["size"] == entry["size"] and known.get("hash") == entry["hash"]
+
+def remote_matches(sftp, local_path, remote_path, entry, samples=VERIFY_SAMPLES, sample_size=VERIFY_SAMPLE_SIZE):
+    """Tells whether a remote file of the same size holds the local content, without downloading it.
+
+    The server hashes the file when it supports "check-file"; otherwise
+    `samples` pieces spread over the file are read back and compared.
+    """
+    size = entry["size"]
+    with sftp.open(remote_path, "r") as remote_file:
+        try:
+            return remote_file.check("sha256", 0, 0, 0).hex() == entry["hash"]
+        except (IOError, paramiko.SSHException):
+            pass  # Not supported by OpenSSH
+
+        if size <= samples * sample_size:
+            ranges = [(0, size)] if size else []
+        else:
+            step = (size - sample_size) // (samples - 1)
+            ranges = [(index * step, sample_size) for index in range(samples)]
+        remote_data = list(remote_file.readv(ranges))
+
+    with open(local_path, "rb") as local_file:
+        for (offset, length), data in zip(ranges, remote_data):
+            local_file.seek(offset)
+            if local_file.read(length) != data:
+                return False
+    return True
+
+def carry_blocks(entry, known):
+    if known and known.get("blocks") and known.get("hash") == entry.get("hash"):
+        entry["blocks"] = known["blocks"]
+
+# --- Delta transfer of large files: only the changed blocks are written ---
+def file_hashes(path, block_size=DELTA_BLOCK_SIZE):
+    """Returns the whole-file hash and the list of block hashes, in a single pass."""
+    sha256 = hashlib.sha256()
+    blocks = []
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(block_size), b""):
+            sha256.update(chunk)
+            blocks.append(hashlib.sha256(chunk).hexdigest())
+    return sha256.hexdigest(), blocks
+
+def remote_blocks(remote_file, known, block_size):
+    """Block hashes of the remote file, from the cheapest source available.
+
+    1. The server hashes its blocks itself (SFTP "check-file" extension).
+    2. The manifest of the last upload, if the remote size and mtime still match it.
+    3. The blocks are read back with pipelined readv requests and hashed here.
+    """
+    try:
+        digest = remote_file.check("sha256", 0, 0, block_size)
+        return [digest[i:i + 32].hex() for i in range(0, len(digest), 32)]
+    except (IOError, paramiko.SSHException):
+        pass  # Not supported by OpenSSH
+
+    stat = remote_file.stat()
+    if known and known.get("blocks") and known["size"] == stat.st_size and int(stat.st_mtime) == known["mtime"] // 10**9:
+        return known["blocks"]
+
+    ranges = [(offset, min(block_size, stat.st_size - offset)) for offset in range(0, stat.st_size, block_size)]
+    return [hashlib.sha256(data).hexdigest() for data in remote_file.readv(ranges)]
+
+def delta_upload(sftp, local_path, remote_path, entry, known, progress, lock, block_size=DELTA_BLOCK_SIZE):
+    """Rewrites in place the blocks of remote_path that differ; returns the bytes written.
+
+    Blocks are compared at the same offsets: data inserted in the middle of
+    a file rewrites everything after it, SFTP cannot move remote data.
+    """
+    written = 0
+    with sftp.open(remote_path, "r+") as remote_file:
+        remote = remote_blocks(remote_file, known, block_size)
+        remote_file.set_pipelined(True)
+        with open(local_path, "rb") as local_file:
+            for index, block_hash in enumerate(entry["blocks"]):
+                data = local_file.read(block_size)
+                if index >= len(remote) or remote[index] != block_hash:
+                    remote_file.seek(index * block_size)
+                    remote_file.write(data)
+                    written += len(data)
+                with lock:
+                    progress.update(len(data))
+        remote_file.truncate(entry["size"])
+    return written
+
+# --- Upload worker: one per SFTP channel, all fed by the same queue ---
+def upload_worker(sftp, jobs, progress, lock, synced, errors, delta_threshold, stats):
+    while True:
+        try:
+            local_path, remote_path, key, entry, known, verify = jobs.get_nowait()
+        except queue.Empty:
+            return
+
+        try:
+            # Matched by size only on the first run: checked once, uploaded only if it differs
+            if verify:
+                if remote_matches(sftp, local_path, remote_path, entry):
+                    entry.pop("unverified", None)
+                    with lock:
+                        synced[key] = entry
+                        stats["verified"] += 1
+                        progress.update(entry["size"])
+                    continue
+                entry.pop("unverified", None)
+
+            delta = delta_threshold and entry["size"] >= delta_threshold
+            if delta:
+                # Already hashed when the manifest check read the file
+                if "blocks" not in entry:
+                    entry["hash"], entry["blocks"] = file_hashes(local_path)
+                try:
+                    written = delta_upload(sftp, local_path, remote_path, entry, known, progress, lock)
+                except FileNotFoundError:
+                    written = None  # Not on the server yet: full upload
+                if written is not None:
+                    # Same mtime as the local file, so the next run can trust the manifest blocks
+                    sftp.utime(remote_path, (time.time(), entry["mtime"] // 10**9))
+                    with lock:
+                        synced[key] = entry
+                        stats["delta_files"] += 1
+                        stats["delta_size"] += entry["size"]
+                        stats["delta_written"] += written
+                    continue
+
+            sent = [0]
+
+            def advance(transferred, total):
+                with lock:
+                    progress.update(transferred - sent[0])
+                sent[0] = transferred
+
+            sftp.put(local_path, remote_path, callback=advance)
+            if delta:
+                sftp.utime(remote_path, (time.time(), entry["mtime"] // 10**9))
+            with lock:
+                synced[key] = entry
+        except (IOError, paramiko.SSHException) as e:
+            with lock:
+                errors.append((remote_path, e))
+
 # --- Transfer with filter and progress ---
-def transfer_files(local_dir, remote_dir, sftp):
+def transfer_files(local_dir, remote_dir, sftp, channels=SFTP_CHANNELS, manifest_path=None, strong_hash=STRONG_HASH,
+                   listing_cache_path=None, listing_cache_hours=LISTING_CACHE_HOURS, delta_threshold=DELTA_THRESHOLD):
     ignored_extensions = (".tmp", ".ds_store", ".log")
 
     format_log("[INFO]", "Scanning local files (excluding root)...", LogColors.YELLOW)
@@ -50,21 +316,104 @@ def transfer_files(local_dir, remote_dir, sftp):
             relative_path = os.path.relpath(full_path, local_dir)
             local_files.append((full_path, relative_path))
 
-    remote_files = list_remote_files(sftp, remote_dir)
+    # With a manifest from a previous run, only local stats are needed
+    manifest = load_manifest(manifest_path)
+    if manifest is None:
+        remote_files = load_listing_cache(listing_cache_path, listing_cache_hours)
+        if remote_files is None:
+            format_log("[INFO]", f"Scanning remote tree over {channels} SFTP channel(s)...", LogColors.YELLOW)
+            remote_files = list_remote_files(sftp, remote_dir, channels)
+            format_log("[INFO]", f"{len(remote_files)} remote files found.", LogColors.YELLOW)
+        else:
+            format_log("[INFO]", "Using the cached remote listing, remote tree not scanned.", LogColors.YELLOW)
+    else:
+        format_log("[INFO]", "Using the sync manifest, remote tree not scanned.", LogColors.YELLOW)
 
-    format_log("[INFO]", f"{len(local_files)} files to evaluate for transfer.\n", LogColors.YELLOW)
-    for local_path, relative_path in tqdm(local_files, desc="Transferring", unit="file"):
+    format_log("[INFO]", f"{len(local_files)} files to evaluate for transfer.", LogColors.YELLOW)
+    jobs = queue.Queue()
+    total_bytes = 0
+    synced = {}
+    for local_path, relative_path in local_files:
         remote_path = f"{remote_dir}/{relative_path}"
-        local_size = os.path.getsize(local_path)
+        stat = os.stat(local_path)
+        key = relative_path.replace(os.sep, "/")
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+        known = manifest.get(key) if manifest else None
+
+        if manifest is None:
+            # First run: the remote size is all there is to compare. A size match
+            # is recorded as unverified; STRONG_HASH checks it against the server
+            if manifest_path:
+                hash_entry(local_path, entry, delta_threshold)
+            if remote_files.get(remote_path) == stat.st_size:
+                if not manifest_path:
+                    continue  # Same size already exists
+                entry["unverified"] = True
+                if not strong_hash:
+                    synced[key] = entry
+                    continue
+        elif is_unchanged(local_path, entry, known, strong_hash, delta_threshold):
+            if not known.get("unverified"):
+                synced[key] = entry
+                continue
+            entry["unverified"] = True
+            if not strong_hash:
+                synced[key] = entry
+                continue
+        jobs.put((local_path, remote_path, key, entry, known, entry.get("unverified", False)))
+        total_bytes += stat.st_size
 
-        if remote_path in remote_files and remote_files[remote_path] == local_size:
-            continue  # Identical file already exists
-        remote_folder = os.path.dirname(remote_path)
+    to_send = jobs.qsize()
+    to_verify = sum(1 for job in jobs.queue if job[5])
+    channels = max(1, min(channels, to_send))
+    if to_verify:
+        format_log("[INFO]", f"{to_verify} size-matched files to check against the server.", LogColors.YELLOW)
+    format_log("[INFO]", f"{to_send - to_verify} files to upload over {channels} SFTP channel(s).\n", LogColors.YELLOW)
+
+    # Remote folders are created once, before the workers start
+    # (files only checked are already on the server)
+    for remote_folder in sorted({os.path.dirname(job[1]) for job in jobs.queue if not job[5]}):
         try:
             sftp.makedirs(remote_folder)
         except IOError:
             pass
-        sftp.put(local_path, remote_path)
+
+    clients = open_channels(sftp, channels)
+
+    lock = threading.Lock()
+    errors = []
+    stats = {"verified": 0, "delta_files": 0, "delta_size": 0, "delta_written": 0}
+    with tqdm(total=total_bytes, desc="Transferring", unit="B", unit_scale=True, unit_divisor=1024) as progress:
+        workers = [
+            threading.Thread(target=upload_worker, args=(client, jobs, progress, lock, synced, errors,
+                                                        delta_threshold, stats), daemon=True)
+            for client in clients
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    for client in clients[1:]:
+        client.close()
+
+    for remote_path, error in errors:
+        format_log("[ERROR]", f"{remote_path}: {error}", LogColors.RED)
+    format_log("[INFO]", f"{to_send - stats['verified'] - len(errors)} files uploaded, {len(errors)} failed.",
+               LogColors.YELLOW)
+    if stats["verified"]:
+        format_log("[INFO]", f"{stats['verified']} size-matched files confirmed identical on the server.", LogColors.YELLOW)
+    if stats["delta_files"]:
+        format_log("[INFO]", f"Delta: {stats['delta_files']} large files updated, "
+                             f"{stats['delta_written'] / 1048576:.1f} MB written of {stats['delta_size'] / 1048576:.1f} MB.",
+                   LogColors.YELLOW)
+
+    # Failed files are left out of the manifest so the next run retries them
+    if manifest_path:
+        save_manifest(manifest_path, remote_dir, synced)
+    if listing_cache_path and listing_cache_hours > 0 and manifest is None:
+        remote_files.update({f"{remote_dir}/{key}": entry["size"] for key, entry in synced.items()})
+        save_listing_cache(listing_cache_path, remote_files)
 
 # --- SFTP mkdirs helper ---
 def sftp_makedirs(sftp, remote_dir):
@@ -121,7 +470,9 @@ def main():
             format_log("[INFO]", "Remote directory doesn't exist, creating...", LogColors.YELLOW)
             sftp.makedirs(remote_dir)
 
-        transfer_files(local_dir, remote_dir, sftp)
+        manifest_path = manifest_path_for(host, remote_dir) if SYNC_MANIFEST else None
+        transfer_files(local_dir, remote_dir, sftp, manifest_path=manifest_path,
+                       listing_cache_path=manifest_path_for(host, remote_dir, ".listing.json"))
 
         sftp.close()
         transport.close()
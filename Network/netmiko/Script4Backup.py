@@ -3,19 +3,18 @@
 ######################################################
 
 import sys
-import csv
 import os
 import logging
-from datetime import datetime
 from getpass import getpass
-from netmiko import (
-    ConnectHandler,
-    NetmikoTimeoutException,
-    NetmikoAuthenticationException
-)
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from banner import print_banner
+from engine import parse_hostname, run_devices, run_devices_sharded, print_summary, read_failed, save_failed
+from facts import device_facts
+from backupstore import backup_store
+from configarchive import config_archive
+from metrics import run_metrics
+from devices import load_devices, ask_credentials
 
 # Create directories for logging and backups if they do not exist
 os.makedirs("Logging", exist_ok=True)
@@ -28,79 +27,43 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(levelname)s - %(message)s"
 )
 
-def save_switch_config(ip, username, password, device_type="aruba_osswitch"):
-    """Connects to a switch, retrieves the hostname and configuration, and saves them."""
-    try:
-        print("\n-----------------------------------------------------------------------------")
-        print(f"\n🌐 Connecting to switch {ip}...")
-        logging.info(f"🌐 Connecting to switch {ip}")
-
-        connection = ConnectHandler(
-            device_type=device_type,
-            host=ip,
-            username=username,
-            password=password
-        )
-
-        print(f"✅ Successfully connected to {ip}. Retrieving hostname and configuration...")
-        logging.info(f"✅ Successfully connected to {ip}")
-
-        # Retrieve the hostname (more robust parsing)
-        hostname_output = connection.send_command("show running-config | include hostname")
-        hostname = "unknown_hostname"
-        if hostname_output:
-            parts = hostname_output.strip().split()
-            if len(parts) >= 2:
-                hostname = parts[-1]
-
-        # Retrieve the running configuration
-        config_output = connection.send_command("show running-config")
-
-        # Save the configuration with a timestamp to avoid overwriting
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_name = f"Backup/{ip}_{hostname}_backup_{timestamp}.cfg"
-
-        with open(file_name, "w") as config_file:
-            config_file.write(config_output)
-
-        print(f"✅ Configuration for {hostname} ({ip}) saved to {file_name}")
-        logging.info(f"✅ Configuration for {hostname} ({ip}) saved to {file_name}")
+# Devices that failed in the last run, for retry_failed
+FAILED_FILE = "Logging/backup_failed.json"
 
-        connection.disconnect()
-        print(f"❌ Connection closed for {ip} ({hostname}).")
+def write_config(ip, hostname, config_output):
+    """Saves a running configuration to the backup store if it changed since the last backup."""
+    entry, changed = backup_store.save(ip, hostname, config_output)
+    file_name = backup_store.object_path(entry["hash"])
 
-    except NetmikoTimeoutException:
-        print(f"⛔ ERROR: Timeout while connecting to {ip}")
-        logging.error(f"⛔ Timeout while connecting to {ip}")
+    if not changed:
+        print(f"💤 Configuration for {hostname} ({ip}) unchanged since {entry['timestamp']}")
+        logging.info(f"💤 Configuration for {hostname} ({ip}) unchanged since {entry['timestamp']}")
+        return file_name
 
-    except NetmikoAuthenticationException:
-        print(f"⛔ ERROR: Authentication failed for {ip}")
-        logging.error(f"⛔ Authentication failed for {ip}")
+    # Also keep the compact long-term history (keyframes + compressed deltas)
+    config_archive.append(ip, entry["timestamp"], config_output)
 
-    except Exception as e:
-        print(f"⛔ Unexpected error with {ip}: {str(e)}")
-        logging.error(f"⛔ Unexpected error with {ip}: {str(e)}")
+    print(f"✅ Configuration for {hostname} ({ip}) saved to {file_name}")
+    logging.info(f"✅ Configuration for {hostname} ({ip}) saved to {file_name}")
+    return file_name
 
 
-def read_csv(file_csv):
-    """Reads a CSV file and returns a list of switch IPs (1st column)."""
-    print(f"\n👀 Reading IP list from {file_csv}...")
-    ip_list = []
+def save_switch_config(connection, ip):
+    """Retrieves the hostname and configuration of a connected switch, and saves them."""
+    print(f"✅ Successfully connected to {ip}. Retrieving configuration...")
 
-    with open(file_csv, mode="r", newline="") as file:
-        csv_reader = csv.reader(file)
-        for row in csv_reader:
-            if not row:
-                continue
-            ip = row[0].strip()
-            if ip:
-                ip_list.append(ip)
+    # Retrieve the running configuration; the hostname is read from it
+    with run_metrics.timed("command"):
+        config_output = connection.send_command("show running-config")
+    hostname = parse_hostname(config_output)
+    device_facts.update(ip, hostname=hostname)
 
-    print(f"👀 Found {len(ip_list)} IPs in {file_csv}.")
-    return ip_list
+    with run_metrics.timed("write"):
+        return write_config(ip, hostname, config_output)
 
 
-def main(file_csv, device_type="aruba_osswitch"):
+def main(file_csv, device_type="aruba_osswitch", max_workers=10, timeout=30, retries=0, processes=1,
+         breaker_threshold=5, retry_failed=False, preflight="last", device_filter=None, compact=True):
     """Main function to process switches in bulk and save configurations."""
     print_banner(
         name        = "💾 Config Backup",
@@ -116,10 +79,51 @@ def main(file_csv, device_type="aruba_osswitch"):
     username = input("\nLogin: ")
     password = getpass("Password: ")
 
-    ip_list = read_csv(file_csv)
+    # Devices of the inventory file, optionally filtered (site, tag, platform, ...)
+    ip_list = load_devices(file_csv, device_filter)
+    credentials = ask_credentials(ip_list, username, password)
+
+    # Only the devices that failed in the previous run
+    if retry_failed:
+        failed = read_failed(FAILED_FILE)
+        ip_list = [ip for ip in ip_list if ip in failed]
+        print(f"🔁 Retrying {len(ip_list)} devices that failed in the previous run.")
+
+    if processes > 1:
+        # Hashing and archiving run in several processes, max_workers threads each
+        results = run_devices_sharded(
+            ip_list, save_switch_config, username, password,
+            device_type=device_type,
+            processes=processes,
+            max_workers=max_workers,
+            timeout=timeout,
+            retries=retries,
+            breaker_threshold=breaker_threshold,
+            preflight=preflight,
+            credentials=credentials
+        )
+    else:
+        results = run_devices(
+            ip_list, save_switch_config, username, password,
+            device_type=device_type,
+            max_workers=max_workers,
+            timeout=timeout,
+            retries=retries,
+            breaker_threshold=breaker_threshold,
+            preflight=preflight,
+            credentials=credentials
+        )
+    save_failed(results, FAILED_FILE)
 
-    for ip in ip_list:
-        save_switch_config(ip, username, password, device_type=device_type)
+    # The archive holds the history: only the latest configuration per device stays a plain file
+    if compact:
+        removed, freed = backup_store.compact(config_archive)
+        print(f"🧹 {removed} archived configurations removed from {backup_store.objects_dir} "
+              f"({freed / 1048576:.1f} MB freed)")
+        logging.info(f"🧹 {removed} archived configurations removed ({freed} bytes)")
+
+    print_summary(results)
+    run_metrics.report("backup", results)
 
     print("\n################################################")
     print("#     Bulk configuration backup completed.     #")
@@ -136,4 +140,34 @@ if __name__ == "__main__":
     # Netmiko device type
     device_type = "aruba_osswitch"
 
-    main(file_csv, device_type=device_type)
\ No newline at end of file
+    # Number of switches backed up in parallel
+    max_workers = 10
+
+    # Connection/authentication timeout per device (seconds)
+    timeout = 30
+
+    # Number of retries after a connection timeout
+    retries = 1
+
+    # Number of processes the switch list is split across (1 = threads only)
+    processes = 1
+
+    # Skip the rest of a /24 after N consecutive connection timeouts (0 = never)
+    breaker_threshold = 5
+
+    # True: only process the devices that failed in the previous run
+    retry_failed = False
+
+    # Check the SSH port of every switch first: "last" = unreachable ones at the end,
+    # "skip" = do not try them, None = no check
+    preflight = "last"
+
+    # Only the devices matching this filter, e.g. "site=paris and tag=core" (None = all)
+    device_filter = None
+
+    # True: delete the configuration files already in the compressed archive, except the latest per device
+    compact = True
+
+    main(file_csv, device_type=device_type, max_workers=max_workers, timeout=timeout, retries=retries,
+         processes=processes, breaker_threshold=breaker_threshold, retry_failed=retry_failed,
+         preflight=preflight, device_filter=device_filter, compact=compact)
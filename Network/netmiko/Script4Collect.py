@@ -0,0 +1,276 @@
+######################################################
+#   COLLECT CONFIG, LOGS AND INVENTORY IN ONE PASS   #
+######################################################
+
+import sys
+import os
+import logging
+from functools import partial
+from getpass import getpass
+
+# Create directories for logging if they do not exist
+os.makedirs("Logging", exist_ok=True)
+
+# Logging configuration (must run before the Script4* imports below,
+# otherwise their own logging.basicConfig call would take precedence)
+logging.basicConfig(
+    filename="Logging/netmiko_collect.log",
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from banner import print_banner
+from engine import (get_hostname, parse_hostname, iter_command_output, run_devices, print_summary,
+                    read_failed, save_failed)
+from asyncengine import run_devices_async_blocking
+from facts import device_facts
+from Script4Backup import write_config
+from Script4Logging import write_logs, append_new_logs
+from logstore import log_marks
+from metrics import run_metrics
+from devices import load_devices, ask_credentials
+from Script4Inventory import parse_show_version, open_inventory_writer, write_inventory, update_facts, record_inventory
+
+# Devices that failed in the last run, for retry_failed
+FAILED_FILE = "Logging/collect_failed.json"
+
+# Collector name -> command to run on the switch
+COLLECTORS = {
+    "backup": "show running-config",
+    "logs": "show logging",
+    "inventory": "show version",
+}
+
+
+# Used by the async mode when the hostname is neither cached nor in the config
+HOSTNAME_COMMAND = "show running-config | include hostname"
+
+
+def save_output(ip, hostname, collector, output, device_type, compress_logs=False, incremental_logs=True,
+                inventory_writer=None):
+    """Sends the output of one collector to its writer (logs may be an iterable of chunks)."""
+    if collector == "backup":
+        return write_config(ip, hostname, output)
+
+    if collector == "logs":
+        if incremental_logs:
+            return append_new_logs(ip, hostname, output)
+        return write_logs(ip, hostname, output, compress=compress_logs)
+
+    data = parse_show_version(output, device_type)
+    write_inventory(inventory_writer, ip, data)
+    update_facts(ip, data)
+    record_inventory(ip, data)
+    return data
+
+
+def collect_switch_data(connection, ip, collectors, **options):
+    """Runs every requested collector on a single connected switch."""
+    print(f"✅ Successfully connected to {ip}. Collecting {', '.join(collectors)}...")
+    saved = {}
+
+    outputs = {}
+    hostname = "unknown_hostname"
+
+    # When the running-config is collected, the hostname is read from it;
+    # otherwise the cached hostname avoids an extra round trip
+    if "backup" in collectors:
+        with run_metrics.timed("command"):
+            outputs["backup"] = connection.send_command(COLLECTORS["backup"])
+        hostname = parse_hostname(outputs["backup"])
+        device_facts.update(ip, hostname=hostname)
+    elif "logs" in collectors:
+        hostname = get_hostname(connection, ip)
+
+    for collector in collectors:
+        # Logs can be huge: they are streamed straight to disk, timed as a command
+        if collector == "logs":
+            output = iter_command_output(connection, COLLECTORS["logs"])
+        elif collector in outputs:
+            output = outputs[collector]
+        else:
+            with run_metrics.timed("command"):
+                output = connection.send_command(COLLECTORS[collector])
+
+        with run_metrics.timed("command" if collector == "logs" else "write"):
+            saved[collector] = save_output(ip, hostname, collector, output, connection.device_type, **options)
+
+    return saved
+
+
+def async_commands(ip, collectors):
+    """Commands to run on a device in async mode (hostname query only when needed)."""
+    commands = [COLLECTORS[collector] for collector in collectors]
+    if "logs" in collectors and "backup" not in collectors and not device_facts.get(ip, "hostname"):
+        commands.insert(0, HOSTNAME_COMMAND)
+    return commands
+
+
+def save_async_outputs(ip, outputs, collectors, device_type, **options):
+    """Routes the outputs of an async collection ({command: output}) to the writers."""
+    print(f"✅ Data collected from {ip}. Saving {', '.join(collectors)}...")
+    saved = {}
+
+    if "backup" in collectors:
+        hostname = parse_hostname(outputs[COLLECTORS["backup"]])
+    elif HOSTNAME_COMMAND in outputs:
+        hostname = parse_hostname(outputs[HOSTNAME_COMMAND])
+    else:
+        hostname = device_facts.get(ip, "hostname", "unknown_hostname")
+    device_facts.update(ip, hostname=hostname)
+
+    for collector in collectors:
+        output = outputs[COLLECTORS[collector]]
+        if collector == "logs":
+            output = [output]
+        # The platform of the device (inventory file) wins over the run default
+        saved[collector] = save_output(ip, hostname, collector, output, getattr(ip, "device_type", None) or device_type,
+                                       **options)
+
+    return saved
+
+
+def main(file_csv, collectors=("backup", "logs", "inventory"), device_type="aruba_osswitch",
+         max_workers=10, timeout=30, retries=0, compress_logs=False, incremental_logs=True,
+         inventory_format="csv", mode="threads", max_concurrency=1000, subnet_rate=10, breaker_threshold=5,
+         retry_failed=False, preflight="last", device_filter=None):
+    """Main function to collect configurations, logs and inventory with one session per switch."""
+    print_banner(
+        name        = "🧺 Switch Collect",
+        description = "🌐 Backup config, logs and inventory in a single SSH session",
+        version     = "1.0",
+        author      = "shinydisk",
+    )
+
+    unknown = [c for c in collectors if c not in COLLECTORS]
+    if unknown:
+        print(f"⛔ Unknown collectors: {', '.join(unknown)} (expected {', '.join(COLLECTORS)})")
+        return
+
+    logging.info("###############################################")
+    logging.info("#       Starting bulk data collection         #")
+    logging.info("###############################################")
+
+    # 🔐 Ask for credentials at runtime (not stored in clear text)
+    username = input("\nLogin: ")
+    password = getpass("Password: ")
+
+    # Devices of the inventory file, optionally filtered (site, tag, platform, ...)
+    ip_list = load_devices(file_csv, device_filter)
+    credentials = ask_credentials(ip_list, username, password)
+
+    # Only the devices that failed in the previous run
+    if retry_failed:
+        failed = read_failed(FAILED_FILE)
+        ip_list = [ip for ip in ip_list if ip in failed]
+        print(f"🔁 Retrying {len(ip_list)} devices that failed in the previous run.")
+
+    inventory_writer = open_inventory_writer(inventory_format) if "inventory" in collectors else None
+    if inventory_writer:
+        inventory_writer.start()
+
+    options = {
+        "compress_logs": compress_logs,
+        "incremental_logs": incremental_logs,
+        "inventory_writer": inventory_writer,
+    }
+    try:
+        if mode == "async":
+            # One event loop holds thousands of sessions; writers run in a small thread pool
+            results = run_devices_async_blocking(
+                ip_list,
+                partial(async_commands, collectors=list(collectors)),
+                partial(save_async_outputs, collectors=list(collectors), device_type=device_type, **options),
+                username, password,
+                device_type=device_type,
+                max_concurrency=max_concurrency,
+                subnet_rate=subnet_rate,
+                timeout=timeout,
+                retries=retries,
+                credentials=credentials
+            )
+        else:
+            results = run_devices(
+                ip_list, partial(collect_switch_data, collectors=list(collectors), **options), username, password,
+                device_type=device_type,
+                max_workers=max_workers,
+                timeout=timeout,
+                retries=retries,
+                breaker_threshold=breaker_threshold,
+                preflight=preflight,
+                credentials=credentials
+            )
+    finally:
+        if inventory_writer:
+            inventory_writer.close()
+
+    log_marks.save()
+    save_failed(results, FAILED_FILE)
+    print_summary(results)
+    run_metrics.report("collect", results)
+
+    print("\n################################################")
+    print("#       Bulk data collection completed.        #")
+    print("################################################\n")
+    logging.info("###############################################")
+    logging.info("#       Bulk data collection completed        #")
+    logging.info("###############################################")
+
+
+if __name__ == "__main__":
+    # CSV file containing switch IPs
+    file_csv = "iplist.csv"
+
+    # What to collect from each switch: "backup", "logs", "inventory"
+    collectors = ["backup", "logs", "inventory"]
+
+    # Netmiko device type
+    device_type = "aruba_osswitch"
+
+    # Number of switches processed in parallel
+    max_workers = 10
+
+    # Connection/authentication timeout per device (seconds)
+    timeout = 30
+
+    # Number of retries after a connection timeout
+    retries = 1
+
+    # Append only new log entries to Logs/<ip>.log (False: full timestamped snapshot per run)
+    incremental_logs = True
+
+    # Gzip-compress log snapshots while they are written (incremental_logs = False only)
+    compress_logs = False
+
+    # Inventory file format: "csv", "jsonl" or "parquet" (needs pyarrow)
+    inventory_format = "csv"
+
+    # "threads": netmiko sessions in a worker pool (max_workers)
+    # "async": asyncssh sessions on one event loop (requires: pip install asyncssh)
+    mode = "threads"
+
+    # Async mode: sessions in flight, and new connections per second to the same /24
+    max_concurrency = 1000
+    subnet_rate = 10
+
+    # Skip the rest of a /24 after N consecutive connection timeouts (threads mode, 0 = never)
+    breaker_threshold = 5
+
+    # True: only process the devices that failed in the previous run
+    retry_failed = False
+
+    # Threads mode: check the SSH port of every switch first: "last" = unreachable ones at the end,
+    # "skip" = do not try them, None = no check
+    preflight = "last"
+
+    # Only the devices matching this filter, e.g. "site=paris and tag=core" (None = all)
+    device_filter = None
+
+    main(file_csv, collectors=collectors, device_type=device_type,
+         max_workers=max_workers, timeout=timeout, retries=retries,
+         compress_logs=compress_logs, incremental_logs=incremental_logs,
+         inventory_format=inventory_format, mode=mode,
+         max_concurrency=max_concurrency, subnet_rate=subnet_rate,
+         breaker_threshold=breaker_threshold, retry_failed=retry_failed,
+         preflight=preflight, device_filter=device_filter)
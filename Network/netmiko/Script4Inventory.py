@@ -3,24 +3,39 @@
 ######################################################
 
 import sys
-import csv
 import os
 import logging
+import re
+from functools import partial
 from getpass import getpass
-from netmiko import (
-    ConnectHandler,
-    NetmikoTimeoutException,
-    NetmikoAuthenticationException
-)
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from banner import print_banner
+from engine import run_devices, run_devices_sharded, print_summary, read_failed, save_failed
+from facts import device_facts
+from writers import BatchWriter
+from inventorydb import inventory_db, describe_change
+from metrics import run_metrics
+from devices import load_devices, ask_credentials
 
 # Définition des dossiers
 os.makedirs("Logging", exist_ok=True)
 os.makedirs("SwitchInventory", exist_ok=True)
 
-output_file = os.path.join("SwitchInventory", "switch_inventory.csv")
+# Schéma du fichier d'inventaire (colonne, type), dans l'ordre des colonnes
+INVENTORY_SCHEMA = [
+    ("IP Address", "string"),
+    ("Hostname", "string"),
+    ("Model", "string"),
+    ("Firmware Version", "string"),
+    ("Release Date", "string"),
+    ("MAC Address", "string"),
+    ("Serial Number", "string"),
+    ("Uptime", "string"),
+    ("Total Ports", "string"),
+    ("Manufacturer", "string"),
+    ("Last Reboot", "string")
+]
 
 # Configuration des logs
 logging.basicConfig(
@@ -29,90 +44,172 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def get_switch_info(ip, username, password, device_type="aruba_osswitch"):
-    """Récupère les informations du switch et les enregistre dans un fichier CSV."""
-    try:
-        print(f"\n🌐 Connexion à {ip}...")
-        logging.info(f"Connexion à {ip}")
+# Switches en échec au dernier run, pour retry_failed
+FAILED_FILE = "Logging/inventory_failed.json"
+
+# Champs d'inventaire, dans l'ordre des colonnes du CSV
+INVENTORY_FIELDS = [
+    "Model",
+    "Firmware Version",
+    "Release Date",
+    "Hostname",
+    "MAC Address",
+    "Serial Number",
+    "Uptime",
+    "Total Ports",
+    "Manufacturer",
+    "Last Reboot"
+]
+
+# Libellés génériques : chaque champ sous son propre nom
+GENERIC_LABELS = {field: field for field in INVENTORY_FIELDS}
+
+# Modèles par plateforme (device_type) pour 'show version' :
+#   "labels"   : libellé en début de ligne -> champ ; un tuple de champs
+#                s'applique à la valeur puis aux lignes de continuation
+#                (None = valeur ignorée)
+#   "defaults" : valeurs connues d'avance pour la plateforme
+SHOW_VERSION_TEMPLATES = {
+    "aruba_osswitch": {
+        "labels": {
+            **GENERIC_LABELS,
+            "Image stamp": (None, "Release Date", "Firmware Version"),
+            "Software revision": "Firmware Version",
+            "System Name": "Hostname",
+            "Base MAC Addr": "MAC Address",
+            "Up Time": "Uptime",
+        },
+        "defaults": {"Manufacturer": "Aruba"},
+    },
+    "aruba_aoscx": {
+        "labels": {
+            **GENERIC_LABELS,
+            "Version": "Firmware Version",
+            "Build Date": "Release Date",
+            "Product Name": "Model",
+            "Chassis Serial Nbr": "Serial Number",
+            "Base MAC Address": "MAC Address",
+            "System Uptime": "Uptime",
+            "Hostname": "Hostname",
+        },
+        "defaults": {"Manufacturer": "Aruba"},
+    },
+}
+
+
+def compile_template(template):
+    """Compile un modèle en une seule regex (libellés alternés) + table libellé -> champs."""
+    labels = template["labels"]
+    # Libellés les plus longs d'abord pour que "Model" ne capture pas "Model Number"
+    alternatives = "|".join(re.escape(label) for label in sorted(labels, key=len, reverse=True))
+    pattern = re.compile(rf"^\s*(?P<label>{alternatives})\s*:\s*(?P<value>.*?)\s*$")
+    fields = {
+        label: field if isinstance(field, tuple) else (field,)
+        for label, field in labels.items()
+    }
+    return pattern, fields, template.get("defaults", {})
+
+
+COMPILED_TEMPLATES = {
+    device_type: compile_template(template)
+    for device_type, template in SHOW_VERSION_TEMPLATES.items()
+}
+GENERIC_TEMPLATE = compile_template({"labels": GENERIC_LABELS})
+
+
+def parse_show_version(output, device_type="aruba_osswitch"):
+    """Extrait les champs d'inventaire de la sortie de 'show version' en une seule passe."""
+    pattern, fields, defaults = COMPILED_TEMPLATES.get(device_type, GENERIC_TEMPLATE)
+
+    # Valeurs par défaut
+    data = {field: "Unknown" for field in INVENTORY_FIELDS}
+    data.update(defaults)
+
+    # Parsing : une regex par ligne, puis les lignes de continuation éventuelles
+    continuation = ()
+    for line in output.splitlines():
+        match = pattern.match(line)
+        if match:
+            targets = fields[match["label"]]
+            if targets[0] and match["value"]:
+                data[targets[0]] = match["value"]
+            continuation = targets[1:]
+        elif continuation and line.startswith((" ", "\t")) and line.strip():
+            if continuation[0]:
+                data[continuation[0]] = line.strip()
+            continuation = continuation[1:]
+        else:
+            continuation = ()
+
+    return data
+
+
+def write_inventory(writer, ip, data):
+    """Envoie la ligne d'inventaire d'un switch au writer (écriture groupée, un seul fichier ouvert)."""
+    writer.put({
+        "IP Address": ip,
+        "Hostname": data["Hostname"],
+        "Model": data["Model"],
+        "Firmware Version": data["Firmware Version"],
+        "Release Date": data["Release Date"],
+        "MAC Address": data["MAC Address"],
+        "Serial Number": data["Serial Number"],
+        "Uptime": data["Uptime"],
+        "Total Ports": data["Total Ports"],
+        "Manufacturer": data["Manufacturer"],
+        "Last Reboot": data["Last Reboot"]
+    })
+
+    logging.info(f"Données enregistrées pour {ip}")
+
+
+def open_inventory_writer(output_format="csv"):
+    """Crée le writer d'inventaire (csv, jsonl ou parquet) ; à utiliser dans un bloc 'with'."""
+    path = os.path.join("SwitchInventory", f"switch_inventory.{output_format}")
+    return BatchWriter(path, INVENTORY_SCHEMA, fmt=output_format)
+
+
+def update_facts(ip, data):
+    """Met à jour le cache de faits partagé avec les autres scripts."""
+    device_facts.update(
+        ip,
+        hostname=data["Hostname"],
+        model=data["Model"],
+        firmware=data["Firmware Version"],
+        serial=data["Serial Number"],
+        mac=data["MAC Address"]
+    )
 
-        device = {
-            'device_type': device_type,
-            'host': ip,
-            'username': username,
-            'password': password,
-        }
 
-        connection = ConnectHandler(**device)
+def record_inventory(ip, data):
+    """Enregistre l'inventaire dans la base et affiche les changements détectés."""
+    changes = inventory_db.update(ip, data)
+    for field, old, new in changes:
+        print(f"🔔 {ip}: {describe_change(field, old, new)}")
+        logging.info(f"🔔 {ip}: {describe_change(field, old, new)}")
+    return changes
+
+
+def get_switch_info(connection, ip, writer):
+    """Récupère les informations du switch connecté et les envoie au writer d'inventaire."""
+    with run_metrics.timed("command"):
         output = connection.send_command("show version")
-        connection.disconnect()
-
-        print(f"✅ Données récupérées pour {ip}")
-
-        # Valeurs par défaut
-        data = {
-            "Model": "Unknown",
-            "Firmware Version": "Unknown",
-            "Release Date": "Unknown",
-            "Hostname": "Unknown",
-            "MAC Address": "Unknown",
-            "Serial Number": "Unknown",
-            "Uptime": "Unknown",
-            "Total Ports": "Unknown",
-            "Manufacturer": "Unknown",
-            "Last Reboot": "Unknown"
-        }
-
-        # Parsing
-        for line in output.split('\n'):
-            for key in data.keys():
-                if key in line:
-                    data[key] = line.split(":")[-1].strip()
-
-        # Écriture CSV
-        with open(output_file, mode='a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([
-                ip,
-                data["Hostname"],
-                data["Model"],
-                data["Firmware Version"],
-                data["Release Date"],
-                data["MAC Address"],
-                data["Serial Number"],
-                data["Uptime"],
-                data["Total Ports"],
-                data["Manufacturer"],
-                data["Last Reboot"]
-            ])
-
-        logging.info(f"Données enregistrées pour {ip}")
-
-    except (NetmikoTimeoutException, NetmikoAuthenticationException) as e:
-        print(f"⛔ Erreur de connexion à {ip}: {str(e)}")
-        logging.error(f"Erreur de connexion à {ip}: {str(e)}")
-
-    except Exception as e:
-        print(f"⛔ Erreur inattendue sur {ip}: {str(e)}")
-        logging.error(f"Erreur inattendue sur {ip}: {str(e)}")
-
-
-def read_csv(file_csv):
-    """Lit un CSV et retourne la liste des IP."""
-    ip_list = []
-
-    with open(file_csv, mode='r', newline='') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if not row:
-                continue
-            ip = row[0].strip()
-            if ip:
-                ip_list.append(ip)
-
-    return ip_list
-
-
-def main(file_csv, device_type="aruba_osswitch"):
+
+    print(f"✅ Données récupérées pour {ip}")
+
+    data = parse_show_version(output, connection.device_type)
+    with run_metrics.timed("write"):
+        # En mode multi-processus, la ligne est écrite par le processus principal
+        if writer is not None:
+            write_inventory(writer, ip, data)
+        update_facts(ip, data)
+        record_inventory(ip, data)
+    return data
+
+
+def main(file_csv, device_type="aruba_osswitch", max_workers=10, timeout=30, retries=0, output_format="csv",
+         max_age_hours=168, full_refresh=False, processes=1, breaker_threshold=5, retry_failed=False,
+         preflight="last", device_filter=None):
 
     print_banner(
         name        = "📋 Switch Inventory",
@@ -125,27 +222,59 @@ def main(file_csv, device_type="aruba_osswitch"):
     username = input("Login: ")
     password = getpass("Password: ")
 
-    ip_list = read_csv(file_csv)
-
-    # Initialisation du fichier CSV avec les en-têtes
-    with open(output_file, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            "IP Address",
-            "Hostname",
-            "Model",
-            "Firmware Version",
-            "Release Date",
-            "MAC Address",
-            "Serial Number",
-            "Uptime",
-            "Total Ports",
-            "Manufacturer",
-            "Last Reboot"
-        ])
-
-    for ip in ip_list:
-        get_switch_info(ip, username, password, device_type=device_type)
+    # Équipements du fichier d'inventaire, éventuellement filtrés (site, tag, plateforme, ...)
+    ip_list = load_devices(file_csv, device_filter)
+    credentials = ask_credentials(ip_list, username, password)
+
+    # Seuls les équipements nouveaux, signalés ou trop anciens sont interrogés
+    if retry_failed:
+        failed = read_failed(FAILED_FILE)
+        to_poll = [ip for ip in ip_list if ip in failed]
+        print(f"🔁 Nouvelle tentative sur {len(to_poll)} switches en échec au run précédent.")
+    elif full_refresh:
+        to_poll = ip_list
+    else:
+        to_poll = inventory_db.to_poll(ip_list, max_age_hours=max_age_hours)
+    polled = set(to_poll)
+    cached = inventory_db.records([ip for ip in ip_list if ip not in polled])
+    print(f"👀 {len(to_poll)} switches à interroger, {len(cached)} à jour dans la base.")
+
+    # Un seul writer pour tout le run : le fichier est ouvert une fois
+    with open_inventory_writer(output_format) as writer:
+        for ip, data in cached.items():
+            write_inventory(writer, ip, data)
+
+        if processes > 1:
+            # Le parsing est réparti sur plusieurs processus ; le writer reste dans celui-ci
+            results = run_devices_sharded(
+                to_poll, partial(get_switch_info, writer=None), username, password,
+                device_type=device_type,
+                processes=processes,
+                max_workers=max_workers,
+                timeout=timeout,
+                retries=retries,
+                breaker_threshold=breaker_threshold,
+                preflight=preflight,
+                credentials=credentials
+            )
+            for result in results:
+                if result.ok:
+                    write_inventory(writer, result.ip, result.value)
+        else:
+            results = run_devices(
+                to_poll, partial(get_switch_info, writer=writer), username, password,
+                device_type=device_type,
+                max_workers=max_workers,
+                timeout=timeout,
+                retries=retries,
+                breaker_threshold=breaker_threshold,
+                preflight=preflight,
+                credentials=credentials
+            )
+    print(f"✅ {writer.written} lignes écrites dans {writer.path}")
+    save_failed(results, FAILED_FILE)
+    print_summary(results)
+    run_metrics.report("inventory", results)
 
     print("\n########################################")
     print("#        Inventory Completed           #")
@@ -157,4 +286,41 @@ if __name__ == "__main__":
     file_csv = "iplist.csv"
     device_type = "aruba_osswitch"
 
-    main(file_csv, device_type=device_type)
\ No newline at end of file
+    # Nombre de switches interrogés en parallèle
+    max_workers = 10
+
+    # Timeout de connexion/authentification par équipement (secondes)
+    timeout = 30
+
+    # Nombre de nouvelles tentatives après un timeout
+    retries = 1
+
+    # Format du fichier d'inventaire : "csv", "jsonl" ou "parquet" (nécessite pyarrow)
+    output_format = "csv"
+
+    # Réinterroger un switch si sa dernière collecte date de plus de N heures
+    max_age_hours = 168
+
+    # True : interroger tous les switches, quel que soit leur âge
+    full_refresh = False
+
+    # Nombre de processus entre lesquels la liste est répartie (1 = threads uniquement)
+    processes = 1
+
+    # Ignorer le reste d'un /24 après N timeouts de connexion consécutifs (0 = jamais)
+    breaker_threshold = 5
+
+    # True : n'interroger que les switches en échec au run précédent
+    retry_failed = False
+
+    # Test du port SSH de tous les switches avant : "last" = injoignables en dernier,
+    # "skip" = ne pas les tenter, None = pas de test
+    preflight = "last"
+
+    # Uniquement les équipements correspondant au filtre, ex. "site=paris and tag=core" (None = tous)
+    device_filter = None
+
+    main(file_csv, device_type=device_type, max_workers=max_workers, timeout=timeout, retries=retries,
+         output_format=output_format, max_age_hours=max_age_hours, full_refresh=full_refresh,
+         processes=processes, breaker_threshold=breaker_threshold, retry_failed=retry_failed,
+         preflight=preflight, device_filter=device_filter)
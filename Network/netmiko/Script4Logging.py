@@ -3,19 +3,19 @@
 ######################################################
 
 import sys
-import csv
 import os
 import logging
+import gzip
+from functools import partial
 from datetime import datetime
 from getpass import getpass
-from netmiko import (
-    ConnectHandler,
-    NetmikoTimeoutException,
-    NetmikoAuthenticationException
-)
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from banner import print_banner
+from engine import get_hostname, iter_command_output, run_devices, print_summary, read_failed, save_failed
+from logstore import NewLinesFilter, RollingLog, log_marks, log_index
+from metrics import run_metrics
+from devices import load_devices, ask_credentials
 
 # Create directories if they do not exist
 if not os.path.exists('Logging'):
@@ -31,80 +31,71 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def save_switch_logs(ip, username, password, device_type="aruba_osswitch"):
-    """Connects to a switch, retrieves hostname and logs, and saves them."""
-    try:
-        print("\n-----------------------------------------------------------------------------")
-        print(f"\n🌐 Connecting to switch {ip}...")
-        logging.info(f"🌐 Connecting to switch {ip}")
-
-        connection = ConnectHandler(
-            device_type=device_type,
-            host=ip,
-            username=username,
-            password=password
-        )
+# Devices that failed in the last run, for retry_failed
+FAILED_FILE = "Logging/logging_failed.json"
 
-        print(f"✅ Successfully connected to {ip}. Retrieving hostname and logs...")
-        logging.info(f"✅ Successfully connected to {ip}")
+def write_logs(ip, hostname, chunks, compress=False):
+    """Writes the logs of a switch to the Logs directory, chunk by chunk.
 
-        # Retrieve hostname
-        hostname_output = connection.send_command("show running-config | include hostname")
-        
-        hostname = "unknown_hostname"
-        if hostname_output:
-            parts = hostname_output.strip().split()
-            if len(parts) >= 2:
-                hostname = parts[-1]
+    chunks is an iterable of strings (e.g. iter_command_output), so the
+    whole log buffer never has to be held in memory. With compress=True the
+    file is gzip-compressed on the fly.
+    """
+    # Save logs
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    file_name = f"Logs/{ip}_{hostname}_logs_{timestamp}.log"
 
-        # Retrieve logs
-        logs_output = connection.send_command("show logging")
+    if compress:
+        file_name += ".gz"
+        log_file = gzip.open(file_name, 'wt')
+    else:
+        log_file = open(file_name, 'w')
 
-        # Save logs
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_name = f"Logs/{ip}_{hostname}_logs_{timestamp}.log"
+    with log_file:
+        for chunk in chunks:
+            log_file.write(chunk)
 
-        with open(file_name, 'w') as log_file:
-            log_file.write(logs_output)
+    print(f"✅ Logs for {hostname} ({ip}) saved to {file_name}")
+    logging.info(f"✅ Logs for {hostname} ({ip}) saved to {file_name}")
+    return file_name
 
-        print(f"✅ Logs for {hostname} ({ip}) saved to {file_name}")
-        logging.info(f"✅ Logs for {hostname} ({ip}) saved to {file_name}")
 
-        connection.disconnect()
-        print(f"❌ Connection closed for {ip} ({hostname}).")
+def append_new_logs(ip, hostname, chunks, index=True):
+    """Appends only the log entries newer than the last collection to the device's rolling log.
 
-    except NetmikoTimeoutException:
-        print(f"⛔ ERROR: Timeout while connecting to {ip}")
-        logging.error(f"⛔ Timeout while connecting to {ip}")
+    With index=True the new entries are also parsed into the SQLite log index.
+    """
+    new_lines = NewLinesFilter(log_marks.get(ip))
+    lines = new_lines.lines(chunks)
+    if index:
+        lines = log_index.tee(ip, hostname, lines)
+    file_name = RollingLog(ip).append(lines)
+    log_marks.set(ip, new_lines.mark)
 
-    except NetmikoAuthenticationException:
-        print(f"⛔ ERROR: Authentication failed for {ip}")
-        logging.error(f"⛔ Authentication failed for {ip}")
+    print(f"✅ {new_lines.new_lines} new log lines for {hostname} ({ip}) appended to {file_name}")
+    logging.info(f"✅ {new_lines.new_lines} new log lines for {hostname} ({ip}) appended to {file_name}")
+    return file_name
 
-    except Exception as e:
-        print(f"⛔ Unexpected error with {ip}: {str(e)}")
-        logging.error(f"⛔ Unexpected error with {ip}: {str(e)}")
 
+def save_switch_logs(connection, ip, compress=False, incremental=True, index=True):
+    """Retrieves hostname and logs of a connected switch, and streams them to disk."""
+    print(f"✅ Successfully connected to {ip}. Retrieving hostname and logs...")
 
-def read_csv(file_csv):
-    """Reads a CSV file and returns a list of switch IPs."""
-    print(f"\n👀 Reading IP list from {file_csv}...")
-    ip_list = []
+    # Cached hostname when known, saves a round trip to the switch
+    hostname = get_hostname(connection, ip)
 
-    with open(file_csv, mode='r', newline='') as file:
-        csv_reader = csv.reader(file)
-        for row in csv_reader:
-            if not row:
-                continue
-            ip = row[0].strip()
-            if ip:
-                ip_list.append(ip)
+    # Retrieve logs; they are streamed to disk, so the writes are timed with the command
+    logs_output = iter_command_output(connection, "show logging")
 
-    print(f"👀 Found {len(ip_list)} IPs in {file_csv}.")
-    return ip_list
+    with run_metrics.timed("command"):
+        if incremental:
+            return append_new_logs(ip, hostname, logs_output, index=index)
+        return write_logs(ip, hostname, logs_output, compress=compress)
 
 
-def main(file_csv, device_type="aruba_osswitch"):
+def main(file_csv, device_type="aruba_osswitch", max_workers=10, timeout=30, retries=0, compress=False,
+         incremental=True, index=True, breaker_threshold=5, retry_failed=False, preflight="last",
+         device_filter=None):
     """Main function to retrieve logs from multiple switches."""
     print_banner(
         name        = "📜 Switch Logging",
@@ -120,10 +111,30 @@ def main(file_csv, device_type="aruba_osswitch"):
     username = input("\nLogin: ")
     password = getpass("Password: ")
 
-    ip_list = read_csv(file_csv)
-
-    for ip in ip_list:
-        save_switch_logs(ip, username, password, device_type=device_type)
+    # Devices of the inventory file, optionally filtered (site, tag, platform, ...)
+    ip_list = load_devices(file_csv, device_filter)
+    credentials = ask_credentials(ip_list, username, password)
+
+    # Only the devices that failed in the previous run
+    if retry_failed:
+        failed = read_failed(FAILED_FILE)
+        ip_list = [ip for ip in ip_list if ip in failed]
+        print(f"🔁 Retrying {len(ip_list)} devices that failed in the previous run.")
+
+    results = run_devices(
+        ip_list, partial(save_switch_logs, compress=compress, incremental=incremental, index=index), username, password,
+        device_type=device_type,
+        max_workers=max_workers,
+        timeout=timeout,
+        retries=retries,
+        breaker_threshold=breaker_threshold,
+        preflight=preflight,
+        credentials=credentials
+    )
+    log_marks.save()
+    save_failed(results, FAILED_FILE)
+    print_summary(results)
+    run_metrics.report("logging", results)
 
     print("\n################################################")
     print("#      Bulk logs retrieval completed.          #")
@@ -141,4 +152,37 @@ if __name__ == "__main__":
     # Device type (change if needed)
     device_type = "aruba_osswitch"
 
-    main(file_csv, device_type=device_type)
\ No newline at end of file
+    # Number of switches processed in parallel
+    max_workers = 10
+
+    # Connection/authentication timeout per device (seconds)
+    timeout = 30
+
+    # Number of retries after a connection timeout
+    retries = 1
+
+    # Append only new entries to Logs/<ip>.log (False: full timestamped snapshot per run)
+    incremental = True
+
+    # Parse new entries into the SQLite index Logs/logs.db (incremental = True only)
+    index = True
+
+    # Gzip-compress snapshot files while they are written (incremental = False only)
+    compress = False
+
+    # Skip the rest of a /24 after N consecutive connection timeouts (0 = never)
+    breaker_threshold = 5
+
+    # True: only process the devices that failed in the previous run
+    retry_failed = False
+
+    # Check the SSH port of every switch first: "last" = unreachable ones at the end,
+    # "skip" = do not try them, None = no check
+    preflight = "last"
+
+    # Only the devices matching this filter, e.g. "site=paris and tag=core" (None = all)
+    device_filter = None
+
+    main(file_csv, device_type=device_type, max_workers=max_workers, timeout=timeout, retries=retries,
+         compress=compress, incremental=incremental, index=index, breaker_threshold=breaker_threshold,
+         retry_failed=retry_failed, preflight=preflight, device_filter=device_filter)
@@ -3,88 +3,161 @@
 ##########################################
 
 import sys
-import csv
 import logging
 import os
+import re
+import time
+from functools import partial
 from getpass import getpass
-from netmiko import (
-    ConnectHandler,
-    NetmikoTimeoutException,
-    NetmikoAuthenticationException,
-)
-
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from banner import print_banner
 
 # Create directories for logging if they do not exist
 if not os.path.exists("Logging"):
     os.makedirs("Logging")
 
-# Logging configuration
+# Logging configuration (must run before the Script4Backup import below,
+# otherwise its own logging.basicConfig call would take precedence)
 logging.basicConfig(
     filename="Logging/netmiko-push.log",
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
 
+# Devices that failed in the last run, for retry_failed
+FAILED_FILE = "Logging/push_failed.json"
 
-def send_switch_config(ip, commands, username, password, device_type="aruba_aoscx"):
-    """Connects to a switch and sends the configuration."""
-    try:
-        print("\n-----------------------------------------------------------------------------")
-        print(f"\n🌐 Connecting to switch {ip}...")
-        logging.info(f"🌐 Connecting to switch {ip}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from banner import print_banner
+from engine import DeviceResult, run_devices, print_summary, read_failed, save_failed
+from facts import device_facts
+from sessions import SessionPool
+from backupstore import backup_store
+from metrics import run_metrics
+from devices import load_devices, ask_credentials
+from Script4Backup import save_switch_config
 
-        # Device connection details
-        connection = ConnectHandler(
-            device_type=device_type,
-            host=ip,
-            username=username,
-            password=password,
-        )
 
-        print(f"✅ Successfully connected to {ip}. Sending configuration...")
-        logging.info(f"✅ Successfully connected to {ip}")
+# Output lines showing that the switch rejected a command
+CONFIG_ERROR_PATTERN = r"Invalid input|Unknown command|Incomplete command|% Error"
+
+# Commands that enter a configuration context (their sub-commands are indented in the config)
+CONTEXT_COMMAND = re.compile(
+    r"^(vlan|interface|router|vrf|ip access-list|ipv6 access-list|mac-access-list|class|policy|qos|aaa group)\b"
+)
+
+# Commands that only move between modes or save, never present in a config
+MODE_COMMANDS = ("configure", "configure terminal", "exit", "end", "write memory")
 
-        # Sending the configuration commands
-        output = connection.send_config_set(commands)
-        print(f"\nConfiguration sent to {ip}:\n{output}")
-        logging.info(f"✅ Successfully sent configuration to {ip}")
+# Result value of the switches skipped by the pre-check
+ALREADY_CONFIGURED = "already configured"
 
-        # Closing the connection
-        connection.disconnect()
-        print(f"\n❌ Connection closed for {ip}.")
 
-    except NetmikoTimeoutException:
-        print(f"\n⛔ ERROR: Timeout while connecting to {ip}")
-        logging.error(f"⛔ Timeout while connecting to {ip}")
+def normalize_command(line):
+    """Strips quotes and repeated spaces so a command matches its running-config form."""
+    return " ".join(line.replace('"', "").split())
 
-    except NetmikoAuthenticationException:
-        print(f"\n⛔ ERROR: Authentication failed for {ip}")
-        logging.error(f"⛔ Authentication failed for {ip}")
 
-    except Exception as e:
-        print(f"\n⛔ Unexpected error with {ip}: {str(e)}")
-        logging.error(f"⛔ Unexpected error with {ip}: {str(e)}")
+def config_lines(config_output):
+    """Returns the set of (context, line) of a running-config; context is None at top level."""
+    lines = set()
+    context = None
+    for raw in config_output.splitlines():
+        line = normalize_command(raw)
+        if not line or line.startswith(("!", ";")):
+            continue
+        if raw[0].isspace():
+            if context and line != "exit":
+                lines.add((context, line))
+        else:
+            context = line
+            lines.add((None, line))
+    return lines
 
 
-def read_csv(file_csv):
-    """Reads a CSV file and returns a list of switch IPs."""
-    print(f"\n👀 Reading IP list from {file_csv}...")
-    ip_list = []
-    with open(file_csv, mode="r", newline="") as file:
-        csv_reader = csv.reader(file)
-        for row in csv_reader:
-            if not row:
-                continue
-            ip = row[0].strip()  # Assumes the first column contains the IP
-            if ip:
-                ip_list.append(ip)
-    print(f"👀 Found {len(ip_list)} IPs in {file_csv}.")
-    return ip_list
+def missing_commands(config_output, commands):
+    """Returns the commands not already present in a running-config.
 
+    Sub-commands are looked up under the context opened by the previous
+    context command (vlan, interface, ...) until "exit". Anything that
+    cannot be matched exactly is reported missing, so a device is only
+    skipped when the whole change is already there.
+    """
+    present = config_lines(config_output)
+    missing = []
+    context = None
+    for command in commands:
+        line = normalize_command(command)
+        if not line or line in MODE_COMMANDS:
+            if line in ("exit", "end"):
+                context = None
+            continue
+        if context is None and CONTEXT_COMMAND.match(line):
+            context = line
+            if (None, line) not in present:
+                missing.append(line)
+            continue
+        if (context, line) not in present:
+            missing.append(f"{context} > {line}" if context else line)
+    return missing
 
-def main(file_csv, commands, device_type="device_type"):
+
+def needs_push(ip, commands):
+    """Tells whether the latest backup of a switch lacks some of the commands."""
+    config_output = backup_store.latest_config(ip)
+    if config_output is None:
+        return True
+    missing = missing_commands(config_output, commands)
+    if missing:
+        logging.info(f"🔎 {ip}: {len(missing)} command(s) to push, first: {missing[0]}")
+    return bool(missing)
+
+
+def send_switch_config(connection, ip, commands):
+    """Sends the configuration commands to a connected switch."""
+    # Hostname from the facts cache only, no extra round trip to the switch
+    hostname = device_facts.get(ip, "hostname", "unknown_hostname")
+    print(f"✅ Successfully connected to {ip} ({hostname}). Sending configuration...")
+
+    # Sending the configuration commands; a rejected command fails the device
+    with run_metrics.timed("command"):
+        output = connection.send_config_set(commands, error_pattern=CONFIG_ERROR_PATTERN)
+    print(f"\nConfiguration sent to {ip} ({hostname}):\n{output}")
+    logging.info(f"✅ Successfully sent configuration to {ip} ({hostname})")
+    return output
+
+
+def plan_waves(ip_list, canary_size=0, wave_growth=2, max_wave_size=None):
+    """Splits the switches into a canary wave followed by waves growing by wave_growth.
+
+    With canary_size = 0 every switch is in a single wave.
+    """
+    if canary_size <= 0:
+        return [ip_list] if ip_list else []
+
+    waves = []
+    start, size = 0, canary_size
+    while start < len(ip_list):
+        waves.append(ip_list[start:start + size])
+        start += size
+        size = size * wave_growth
+        if max_wave_size:
+            size = min(size, max_wave_size)
+    return waves
+
+
+def abort_reason(results, canary, max_failure_rate):
+    """Returns why the rollout must stop after a wave, or None to continue."""
+    failed = sum(1 for result in results if not result.ok)
+    if canary and failed:
+        return f"{failed} failure(s) on the canary switches"
+    if results and failed / len(results) > max_failure_rate:
+        return f"failure rate {failed / len(results):.0%} above {max_failure_rate:.0%}"
+    return None
+
+
+def main(file_csv, commands, device_type="device_type", max_workers=10, timeout=30, retries=0,
+         backup_around=False, canary_size=0, wave_growth=2, max_wave_size=None, max_failure_rate=0.1,
+         wave_pause=0, precheck=True, breaker_threshold=5, retry_failed=False, preflight="last",
+         device_filter=None):
     """Main function to process switches in bulk."""
     print_banner(
         name        = "⬆️  Push Config",
@@ -101,10 +174,81 @@ def main(file_csv, commands, device_type="device_type"):
     password = getpass("Password: ")
 
     # Read the IP addresses from the CSV file
-    ip_list = read_csv(file_csv)
+    # Devices of the inventory file, optionally filtered (site, tag, platform, ...)
+    ip_list = load_devices(file_csv, device_filter)
+    credentials = ask_credentials(ip_list, username, password)
+
+    # Only the devices that failed in the previous run
+    if retry_failed:
+        failed = read_failed(FAILED_FILE)
+        ip_list = [ip for ip in ip_list if ip in failed]
+        print(f"🔁 Retrying {len(ip_list)} devices that failed in the previous run.")
+    results = []
 
-    for ip in ip_list:
-        send_switch_config(ip, commands, username, password, device_type=device_type)
+    # Switches whose last backup already contains every command are left alone
+    if precheck:
+        to_push = [ip for ip in ip_list if needs_push(ip, commands)]
+        skipped = set(ip_list) - set(to_push)
+        results = [DeviceResult(ip=ip, ok=True, value=ALREADY_CONFIGURED) for ip in ip_list if ip in skipped]
+        print(f"🔎 {len(results)} switches already configured (last backup), {len(to_push)} to push.")
+        logging.info(f"🔎 {len(results)} switches already configured, {len(to_push)} to push")
+        ip_list = to_push
+
+    waves = plan_waves(ip_list, canary_size, wave_growth, max_wave_size)
+    print(f"🚀 Rollout in {len(waves)} wave(s): {', '.join(str(len(wave)) for wave in waves)} switches.")
+
+    # One session per switch for the whole run, reused by every step
+    with SessionPool() as pool:
+        run = partial(
+            run_devices,
+            username=username,
+            password=password,
+            device_type=device_type,
+            max_workers=max_workers,
+            timeout=timeout,
+            retries=retries,
+            pool=pool,
+            breaker_threshold=breaker_threshold,
+            preflight=preflight,
+            credentials=credentials
+        )
+
+        for number, wave in enumerate(waves):
+            canary = canary_size > 0 and number == 0
+            label = "canary" if canary else f"wave {number + 1}/{len(waves)}"
+            print(f"\n🚀 Pushing {label} ({len(wave)} switches)...")
+            logging.info(f"🚀 Pushing {label}: {', '.join(wave)}")
+
+            if backup_around:
+                print("\n💾 Backing up configurations before the push...")
+                run(wave, save_switch_config)
+
+            wave_results = run(wave, partial(send_switch_config, commands=commands))
+            results += wave_results
+
+            if backup_around:
+                print("\n💾 Backing up configurations after the push...")
+                run([result.ip for result in wave_results if result.ok], save_switch_config)
+
+            # Stop before a bad change reaches the rest of the switches
+            if number == len(waves) - 1:
+                break
+            pushed = [result for result in results if result.value != ALREADY_CONFIGURED]
+            reason = abort_reason(wave_results if canary else pushed, canary, max_failure_rate)
+            if reason:
+                remaining = [ip for later in waves[number + 1:] for ip in later]
+                print(f"\n🛑 Rollout aborted after the {label}: {reason}. {len(remaining)} switches not pushed.")
+                logging.error(f"🛑 Rollout aborted after the {label}: {reason}")
+                results += [DeviceResult(ip=ip, error="not pushed (rollout aborted)") for ip in remaining]
+                break
+
+            if wave_pause:
+                print(f"⏸️  Waiting {wave_pause}s before the next wave...")
+                time.sleep(wave_pause)
+
+    save_failed(results, FAILED_FILE)
+    print_summary(results)
+    run_metrics.report("push", results)
 
     print("#####################################")
     print("#     Bulk operation completed.     #")
@@ -127,5 +271,50 @@ if __name__ == "__main__":
     # Examples: "cisco_ios", "aruba_os", "hp_procurve", etc.
     device_type = "aruba_aoscx"
 
+    # Number of switches configured in parallel
+    max_workers = 10
+
+    # Connection/authentication timeout per device (seconds)
+    timeout = 30
+
+    # Number of retries after a connection timeout
+    retries = 1
+
+    # True: back up each switch before and after the push, over the same session
+    backup_around = False
+
+    # Staged rollout: canary switches first, then waves growing by wave_growth
+    # (canary_size = 0 pushes every switch in a single wave)
+    canary_size = 2
+    wave_growth = 4
+    max_wave_size = 200
+
+    # Abort the remaining waves on any canary failure, or when the share of
+    # failed switches goes above max_failure_rate
+    max_failure_rate = 0.1
+
+    # Seconds to wait between two waves (time to check monitoring)
+    wave_pause = 0
+
+    # Skip the switches whose last backup (Backup/) already contains every command
+    precheck = True
+
+    # Skip the rest of a /24 after N consecutive connection timeouts (0 = never)
+    breaker_threshold = 5
+
+    # True: only process the devices that failed in the previous run
+    retry_failed = False
+
+    # Check the SSH port of every switch first: "last" = unreachable ones at the end,
+    # "skip" = do not try them, None = no check
+    preflight = "last"
+
+    # Only the devices matching this filter, e.g. "site=paris and tag=core" (None = all)
+    device_filter = None
+
     # Call the main function
-    main(file_csv, commands, device_type=device_type)
\ No newline at end of file
+    main(file_csv, commands, device_type=device_type, max_workers=max_workers, timeout=timeout, retries=retries,
+         backup_around=backup_around, canary_size=canary_size, wave_growth=wave_growth,
+         max_wave_size=max_wave_size, max_failure_rate=max_failure_rate, wave_pause=wave_pause,
+         precheck=precheck, breaker_threshold=breaker_threshold, retry_failed=retry_failed,
+         preflight=preflight, device_filter=device_filter)
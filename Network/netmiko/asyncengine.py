@@ -0,0 +1,254 @@
+######################################################
+#       ASYNCIO SSH COLLECTION ENGINE (ASYNCSSH)     #
+######################################################
+
+import asyncio
+import ipaddress
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import DeviceResult, backoff_delay, device_settings
+from facts import device_facts
+from metrics import run_metrics
+
+# The async mode needs the optional "asyncssh" package
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+# ANSI escape sequences sent by Aruba CLIs (cursor moves, colors, ...)
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]|\x1b[A-Za-z]")
+
+# A CLI prompt on the last line: "SW01# ", "SW01(config)# ", "SW01> "
+PROMPT = re.compile(r"^[\w.\-()/]+[#>]\s*$")
+
+# Commands run after login to disable paging, per platform
+SESSION_PREPARATION = {
+    "aruba_osswitch": ["no page"],
+    "aruba_aoscx": ["no page"],
+}
+
+
+class AsyncSession:
+    """SSH CLI session with a netmiko-like command API, for use from asyncio.
+
+        session = await AsyncSession.connect(ip, username, password)
+        output = await session.send_command("show version")
+    """
+
+    def __init__(self, connection, process, device_type, read_timeout):
+        self.connection = connection
+        self.process = process
+        self.device_type = device_type
+        self.read_timeout = read_timeout
+        self.base_prompt = ""
+
+    @classmethod
+    async def connect(cls, ip, username, password, device_type="aruba_osswitch", timeout=30, read_timeout=120,
+                      port=22):
+        """Opens the SSH connection and an interactive shell, then prepares the session."""
+        connection = await asyncssh.connect(
+            str(ip),
+            port=port,
+            username=username,
+            password=password,
+            known_hosts=None,
+            connect_timeout=timeout,
+            login_timeout=timeout
+        )
+        try:
+            process = await connection.create_process(term_type="vt100", term_size=(511, 24), encoding="utf-8")
+            session = cls(connection, process, device_type, read_timeout)
+            await session._prepare(timeout)
+        except BaseException:
+            connection.close()
+            raise
+        return session
+
+    async def _prepare(self, timeout):
+        # Aruba OS-Switch shows a banner and waits for a key before the prompt
+        banner = await self._read_until_prompt(timeout, on_pause="\n")
+        self.base_prompt = banner.rstrip().splitlines()[-1].strip().rstrip("#>").strip()
+        for command in SESSION_PREPARATION.get(self.device_type, []):
+            await self.send_command(command)
+
+    async def _read_until_prompt(self, timeout, on_pause=None):
+        """Reads the channel until a prompt shows up on the last line."""
+        buffer = ""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError("Prompt not received")
+            try:
+                chunk = await asyncio.wait_for(self.process.stdout.read(65536), remaining)
+            except asyncio.TimeoutError:
+                raise asyncio.TimeoutError("Prompt not received")
+            if not chunk:
+                raise ConnectionError("Session closed by the device")
+
+            buffer += ANSI_ESCAPE.sub("", chunk).replace("\r\n", "\n").replace("\r", "")
+            if on_pause and "Press any key to continue" in buffer[-200:]:
+                self.process.stdin.write(on_pause)
+                buffer = ""
+                continue
+
+            last_line = buffer.rsplit("\n", 1)[-1]
+            if PROMPT.match(last_line) and last_line.strip().startswith(self.base_prompt):
+                return buffer
+
+    async def send_command(self, command):
+        """Runs a command and returns its output, without the echo and the prompt."""
+        self.process.stdin.write(command + "\n")
+        output = await self._read_until_prompt(self.read_timeout)
+        lines = output.split("\n")
+        return "\n".join(lines[1:-1])
+
+    async def send_config_set(self, commands):
+        """Enters configuration mode, runs the commands and leaves it."""
+        outputs = [await self.send_command("configure terminal")]
+        for command in commands:
+            outputs.append(await self.send_command(command))
+        outputs.append(await self.send_command("end"))
+        return "\n".join(outputs)
+
+    async def disconnect(self):
+        self.connection.close()
+        await self.connection.wait_closed()
+
+
+class SubnetRateLimiter:
+    """Spaces new connections to the same subnet to at most `rate` per second."""
+
+    def __init__(self, rate=10, prefix=24):
+        self.interval = 1 / rate if rate else 0
+        self.prefix = prefix
+        self._next_slot = {}
+
+    async def wait(self, ip):
+        if not self.interval:
+            return
+        try:
+            subnet = ipaddress.ip_network(f"{ip}/{self.prefix}", strict=False)
+        except ValueError:
+            # Hostnames are spaced on their own
+            subnet = ip
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(subnet, now))
+        self._next_slot[subnet] = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+
+async def _run_device(ip, commands, handler, username, password, device_type, timeout, read_timeout,
+                      retries, semaphore, limiter, executor, credentials):
+    result = DeviceResult(ip=ip)
+    start = time.monotonic()
+    loop = asyncio.get_running_loop()
+    device_type, port, username, password = device_settings(ip, username, password, device_type, credentials)
+
+    while result.attempts <= retries:
+        if result.attempts:
+            # Waiting for a retry does not hold a concurrency slot
+            await asyncio.sleep(backoff_delay(result.attempts))
+        result.attempts += 1
+        # Nor does waiting for the subnet rate limit
+        await limiter.wait(ip)
+        async with semaphore:
+            try:
+                logging.info(f"🌐 Connecting to switch {ip}")
+                with run_metrics.timed("login", ip):
+                    session = await AsyncSession.connect(
+                        ip, username, password,
+                        device_type=device_type,
+                        timeout=timeout,
+                        read_timeout=read_timeout,
+                        port=port
+                    )
+                try:
+                    outputs = {}
+                    with run_metrics.timed("command", ip):
+                        for command in (commands(ip) if callable(commands) else commands):
+                            outputs[command] = await session.send_command(command)
+                finally:
+                    await session.disconnect()
+
+            except (asyncio.TimeoutError, OSError) as e:
+                result.error = "timeout"
+                print(f"⛔ ERROR: Timeout while connecting to {ip}")
+                logging.error(f"⛔ Timeout while connecting to {ip} (attempt {result.attempts}): {e}")
+                continue
+
+            except asyncssh.PermissionDenied:
+                result.error = "authentication failed"
+                print(f"⛔ ERROR: Authentication failed for {ip}")
+                logging.error(f"⛔ Authentication failed for {ip}")
+                break
+
+            except asyncssh.DisconnectError as e:
+                # Dropped sessions (ConnectionLost, resets) are transient, like timeouts
+                result.error = "connection lost"
+                print(f"⛔ ERROR: Connection lost with {ip}")
+                logging.error(f"⛔ Connection lost with {ip} (attempt {result.attempts}): {e}")
+                continue
+
+            except Exception as e:
+                result.error = str(e)
+                print(f"⛔ Unexpected error with {ip}: {str(e)}")
+                logging.error(f"⛔ Unexpected error with {ip}: {str(e)}")
+                break
+
+        # Parsing and disk writes run in threads, off the event loop and outside the
+        # retry handling: a handler error is a task error, the device is not polled again
+        try:
+            with run_metrics.timed("write", ip):
+                result.value = await loop.run_in_executor(executor, handler, ip, outputs)
+            result.ok = True
+            result.error = ""
+        except Exception as e:
+            result.error = str(e)
+            print(f"⛔ Unexpected error with {ip}: {str(e)}")
+            logging.error(f"⛔ Unexpected error with {ip}: {str(e)}")
+        break
+
+    result.elapsed = time.monotonic() - start
+    run_metrics.record(ip, "total", result.elapsed)
+    return result
+
+
+async def run_devices_async(ip_list, commands, handler, username, password, device_type="aruba_osswitch",
+                            max_concurrency=1000, subnet_rate=10, timeout=30, read_timeout=120, retries=0,
+                            handler_workers=4, credentials=None):
+    """Runs the commands on every device from a single event loop.
+
+    commands is a list, or a callable returning the list for a given ip.
+    ip_list may hold devices.Device objects, as with run_devices.
+
+    At most max_concurrency sessions are in flight, and new connections to
+    the same /24 are limited to subnet_rate per second. The outputs of each
+    device ({command: output}) are passed to handler(ip, outputs), which runs
+    in a small thread pool. Returns DeviceResult objects in the order of ip_list.
+    """
+    if asyncssh is None:
+        raise RuntimeError("The async mode needs the 'asyncssh' package (pip install asyncssh)")
+
+    print(f"⚙️  Running async with up to {max_concurrency} sessions ({subnet_rate} new/s per subnet).")
+    semaphore = asyncio.Semaphore(max_concurrency)
+    limiter = SubnetRateLimiter(rate=subnet_rate)
+
+    with ThreadPoolExecutor(max_workers=handler_workers) as executor:
+        results = await asyncio.gather(*(
+            _run_device(ip, commands, handler, username, password, device_type, timeout, read_timeout,
+                        retries, semaphore, limiter, executor, credentials)
+            for ip in ip_list
+        ))
+
+    device_facts.save()
+    return list(results)
+
+
+def run_devices_async_blocking(*args, **kwargs):
+    """Synchronous entry point for run_devices_async."""
+    return asyncio.run(run_devices_async(*args, **kwargs))
@@ -0,0 +1,252 @@
+######################################################
+#     CONTENT-ADDRESSED CONFIGURATION BACKUP STORE   #
+######################################################
+
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+STORE_DIR = "Backup"
+
+# Lines that change on every "show running-config" without any real change
+VOLATILE_PATTERNS = [
+    re.compile(r"^\s*!\s*(Last configuration change|NVRAM config last updated)", re.IGNORECASE),
+    re.compile(r"^\s*!\s*Time:", re.IGNORECASE),
+    re.compile(r"^\s*Building configuration", re.IGNORECASE),
+    re.compile(r"^\s*Current configuration\s*:", re.IGNORECASE),
+    re.compile(r"^\s*ntp clock-period", re.IGNORECASE),
+    re.compile(r"^\s*[;!].*uptime", re.IGNORECASE),
+]
+
+
+def normalize_config(config_output):
+    """Drops volatile lines and trailing whitespace so unchanged configs hash identically."""
+    lines = []
+    for line in config_output.splitlines():
+        line = line.rstrip()
+        if not line or any(pattern.search(line) for pattern in VOLATILE_PATTERNS):
+            continue
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def config_hash(config_output):
+    """Returns the SHA-256 of the normalized configuration."""
+    return hashlib.sha256(normalize_config(config_output).encode("utf-8")).hexdigest()
+
+
+class BackupStore:
+    """Stores each distinct configuration once and keeps a per-device version index.
+
+    Layout:
+        Backup/objects/<sha256>.cfg   raw configuration, one file per distinct content
+        Backup/index/<ip>.json        ordered list of versions for a device
+
+    The compressed archive (configarchive.py) is the long-term store:
+    compact() removes the objects already archived and only keeps the
+    latest configuration of each device as a plain file.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.index_dir = os.path.join(root, "index")
+        self._lock = threading.Lock()
+
+    def _index_path(self, ip):
+        return os.path.join(self.index_dir, f"{ip}.json")
+
+    def object_path(self, digest):
+        """Returns the path of the object file holding a configuration."""
+        return os.path.join(self.objects_dir, f"{digest}.cfg")
+
+    def history(self, ip):
+        """Returns the list of versions of a device, oldest first."""
+        try:
+            with open(self._index_path(ip), "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return []
+
+    def latest(self, ip):
+        """Returns the latest version entry of a device, or None."""
+        versions = self.history(ip)
+        return versions[-1] if versions else None
+
+    def load(self, digest):
+        """Returns the configuration stored under a hash."""
+        with open(self.object_path(digest), "r") as file:
+            return file.read()
+
+    def load_version(self, ip, digest, archive=None):
+        """Returns a configuration of a device, from its object file or, once compacted, from the archive."""
+        try:
+            return self.load(digest)
+        except FileNotFoundError:
+            if archive is None:
+                raise
+            for number, entry in reversed(list(enumerate(archive.versions(ip)))):
+                if entry["hash"] == digest:
+                    return archive.read(ip, number)
+            raise
+
+    def latest_config(self, ip):
+        """Returns the latest stored configuration of a device, or None."""
+        entry = self.latest(ip)
+        return self.load(entry["hash"]) if entry else None
+
+    def save(self, ip, hostname, config_output):
+        """Records a configuration for a device.
+
+        Nothing is written when the normalized content matches the latest
+        version. Returns a tuple (entry, changed).
+        """
+        digest = config_hash(config_output)
+        versions = self.history(ip)
+        if versions and versions[-1]["hash"] == digest:
+            return versions[-1], False
+
+        entry = {
+            "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
+            "hash": digest,
+            "hostname": hostname,
+        }
+
+        with self._lock:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            os.makedirs(self.index_dir, exist_ok=True)
+
+            object_path = self.object_path(digest)
+            if not os.path.exists(object_path):
+                tmp_path = f"{object_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as file:
+                    file.write(config_output)
+                os.replace(tmp_path, object_path)
+
+            versions.append(entry)
+            index_path = self._index_path(ip)
+            tmp_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(versions, file, indent=2)
+            os.replace(tmp_path, index_path)
+
+        return entry, True
+
+    def compact(self, archive):
+        """Deletes the object files already held by the archive.
+
+        The latest version of each device is always kept (the push pre-check
+        reads it), as is any version missing from the archive. Objects written
+        while compacting are left alone. Returns (files removed, bytes freed).
+        """
+        started = time.time()
+        keep = set()
+        if os.path.isdir(self.index_dir):
+            for index_name in os.listdir(self.index_dir):
+                if not index_name.endswith(".json"):
+                    continue
+                ip = index_name[:-len(".json")]
+                versions = self.history(ip)
+                if not versions:
+                    continue
+                archived = {entry["hash"] for entry in archive.versions(ip)}
+                keep.add(versions[-1]["hash"])
+                keep.update(entry["hash"] for entry in versions[:-1] if entry["hash"] not in archived)
+
+        removed, freed = 0, 0
+        if not os.path.isdir(self.objects_dir):
+            return removed, freed
+        with self._lock:
+            for file_name in os.listdir(self.objects_dir):
+                if not file_name.endswith(".cfg") or file_name[:-len(".cfg")] in keep:
+                    continue
+                path = os.path.join(self.objects_dir, file_name)
+                stat = os.stat(path)
+                if stat.st_mtime >= started:
+                    continue
+                os.remove(path)
+                removed += 1
+                freed += stat.st_size
+        return removed, freed
+
+    def diff(self, ip, old_hash, new_hash, archive=None):
+        """Returns a unified diff between two stored configurations of a device."""
+        old = self.load_version(ip, old_hash, archive).splitlines(keepends=True)
+        new = self.load_version(ip, new_hash, archive).splitlines(keepends=True)
+        return "".join(difflib.unified_diff(old, new, fromfile=f"{ip}@{old_hash[:12]}", tofile=f"{ip}@{new_hash[:12]}"))
+
+
+# Shared instance used by the Script4* scripts
+backup_store = BackupStore()
+
+
+def main():
+    """Command line access to the backup index: history, show, diff and compact."""
+    # Imported here: configarchive itself imports this module
+    from configarchive import ConfigArchive
+
+    parser = argparse.ArgumentParser(description="Query the configuration backup store.")
+    parser.add_argument("--root", default=STORE_DIR, help="Backup directory (default: Backup)")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    history_parser = sub.add_parser("history", help="List the stored versions of a device")
+    history_parser.add_argument("ip")
+
+    show_parser = sub.add_parser("show", help="Print a stored configuration (latest by default)")
+    show_parser.add_argument("ip")
+    show_parser.add_argument("hash", nargs="?", help="Version hash (prefix accepted)")
+
+    diff_parser = sub.add_parser("diff", help="Diff two versions (the last two by default)")
+    diff_parser.add_argument("ip")
+    diff_parser.add_argument("old", nargs="?")
+    diff_parser.add_argument("new", nargs="?")
+
+    sub.add_parser("compact", help="Delete the object files already in the archive (latest per device kept)")
+
+    args = parser.parse_args()
+    store = BackupStore(args.root)
+    archive = ConfigArchive(os.path.join(args.root, "archive"))
+
+    if args.action == "compact":
+        removed, freed = store.compact(archive)
+        print(f"🧹 {removed} archived objects removed ({freed / 1048576:.1f} MB freed)")
+        return
+
+    versions = store.history(args.ip)
+    if not versions:
+        print(f"⛔ No backup found for {args.ip}")
+        return
+
+    def resolve(prefix):
+        for entry in reversed(versions):
+            if entry["hash"].startswith(prefix):
+                return entry["hash"]
+        raise SystemExit(f"⛔ No version {prefix} for {args.ip}")
+
+    if args.action == "history":
+        for entry in versions:
+            print(f"{entry['timestamp']}  {entry['hash'][:12]}  {entry['hostname']}")
+
+    elif args.action == "show":
+        digest = resolve(args.hash) if args.hash else versions[-1]["hash"]
+        print(store.load_version(args.ip, digest, archive), end="")
+
+    elif args.action == "diff":
+        if args.old and args.new:
+            old_hash, new_hash = resolve(args.old), resolve(args.new)
+        elif len(versions) >= 2:
+            old_hash, new_hash = versions[-2]["hash"], versions[-1]["hash"]
+        else:
+            print(f"👀 Only one version stored for {args.ip}")
+            return
+        print(store.diff(args.ip, old_hash, new_hash, archive), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+######################################################
+#    COMPRESSED, DELTA-ENCODED CONFIG HISTORY        #
+######################################################
+
+import argparse
+import difflib
+import json
+import os
+import re
+import threading
+import zlib
+
+from backupstore import BackupStore, config_hash
+
+# zstd is used when the optional "zstandard" package is installed, zlib otherwise
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_DIR = os.path.join("Backup", "archive")
+
+# A full snapshot every N versions bounds the number of deltas applied on restore
+KEYFRAME_INTERVAL = 16
+
+# Legacy per-run backup files: {ip}_{hostname}_backup_{YYYYmmdd_HHMMSS}.cfg
+LEGACY_BACKUP = re.compile(r"^(?P<ip>[^_]+)_(?P<hostname>.*)_backup_(?P<timestamp>\d{8}_\d{6})\.cfg$")
+
+
+def _compress(data):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+
+def _decompress(codec, data):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This archive record needs the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def make_delta(old_lines, new_lines):
+    """Encodes new_lines as copy/insert operations against old_lines."""
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["c", i1, i2])
+        elif j2 > j1:
+            ops.append(["i", new_lines[j1:j2]])
+    return ops
+
+
+def apply_delta(old_lines, ops):
+    """Rebuilds the new lines from old_lines and a delta."""
+    lines = []
+    for op in ops:
+        if op[0] == "c":
+            lines.extend(old_lines[op[1]:op[2]])
+        else:
+            lines.extend(op[1])
+    return lines
+
+
+class ConfigArchive:
+    """Per-device archive of configurations: keyframe snapshots plus compressed line deltas.
+
+    Layout:
+        Backup/archive/<ip>.arc        append-only compressed records
+        Backup/archive/<ip>.idx.json   one entry per version (offset, length, kind, base)
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _paths(self, ip):
+        return os.path.join(self.root, f"{ip}.arc"), os.path.join(self.root, f"{ip}.idx.json")
+
+    def versions(self, ip):
+        """Returns the index entries of a device, oldest first."""
+        try:
+            with open(self._paths(ip)[1], "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return []
+
+    def _read_record(self, data_file, entry):
+        data_file.seek(entry["offset"])
+        payload = _decompress(entry["codec"], data_file.read(entry["length"]))
+        return json.loads(payload.decode("utf-8"))
+
+    def read(self, ip, version=-1):
+        """Rebuilds a configuration by version number (negative counts from the latest)."""
+        versions = self.versions(ip)
+        if not versions:
+            raise KeyError(f"No archived configuration for {ip}")
+        entry = versions[version]
+        position = version if version >= 0 else len(versions) + version
+
+        with open(self._paths(ip)[0], "rb") as data_file:
+            lines = self._read_record(data_file, versions[entry["base"]])
+            for delta_entry in versions[entry["base"] + 1:position + 1]:
+                lines = apply_delta(lines, self._read_record(data_file, delta_entry))
+        return "".join(lines)
+
+    def find(self, ip, timestamp):
+        """Returns the version number in effect at a timestamp (YYYYmmdd_HHMMSS), or None."""
+        found = None
+        for number, entry in enumerate(self.versions(ip)):
+            if entry["timestamp"] <= timestamp:
+                found = number
+        return found
+
+    def append(self, ip, timestamp, config_output):
+        """Adds a configuration to a device archive; skipped if identical to the latest."""
+        digest = config_hash(config_output)
+        new_lines = config_output.splitlines(keepends=True)
+
+        with self._lock:
+            versions = self.versions(ip)
+            if versions and versions[-1]["hash"] == digest:
+                return None
+
+            number = len(versions)
+            if number % KEYFRAME_INTERVAL == 0:
+                kind, base, record = "base", number, new_lines
+            else:
+                kind, base = "delta", versions[-1]["base"]
+                record = make_delta(self.read(ip, -1).splitlines(keepends=True), new_lines)
+
+            codec, payload = _compress(json.dumps(record).encode("utf-8"))
+
+            os.makedirs(self.root, exist_ok=True)
+            data_path, index_path = self._paths(ip)
+            with open(data_path, "ab") as data_file:
+                offset = data_file.tell()
+                data_file.write(payload)
+
+            entry = {
+                "timestamp": timestamp,
+                "hash": digest,
+                "kind": kind,
+                "base": base,
+                "codec": codec,
+                "offset": offset,
+                "length": len(payload),
+            }
+            versions.append(entry)
+            tmp_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(versions, file, indent=2)
+            os.replace(tmp_path, index_path)
+
+        return entry
+
+    def import_backups(self, backup_dir="Backup"):
+        """Imports legacy per-run .cfg files and backup store versions, oldest first.
+
+        Returns the number of versions added.
+        """
+        candidates = []
+        for file_name in os.listdir(backup_dir):
+            match = LEGACY_BACKUP.match(file_name)
+            if match:
+                candidates.append((match["ip"], match["timestamp"], os.path.join(backup_dir, file_name)))
+
+        store = BackupStore(backup_dir)
+        if os.path.isdir(store.index_dir):
+            for index_name in os.listdir(store.index_dir):
+                if not index_name.endswith(".json"):
+                    continue
+                ip = index_name[:-len(".json")]
+                for entry in store.history(ip):
+                    candidates.append((ip, entry["timestamp"], store.object_path(entry["hash"])))
+
+        added = 0
+        for ip, timestamp, path in sorted(candidates):
+            archived = self.versions(ip)
+            if archived and timestamp <= archived[-1]["timestamp"]:
+                continue
+            # Removed by BackupStore.compact() once archived
+            if not os.path.exists(path):
+                continue
+            with open(path, "r") as file:
+                if self.append(ip, timestamp, file.read()):
+                    added += 1
+        return added
+
+
+# Shared instance used by the Script4* scripts
+config_archive = ConfigArchive()
+
+
+def main():
+    """Command line access to the archive: import, list and restore."""
+    parser = argparse.ArgumentParser(description="Compressed configuration history archive.")
+    parser.add_argument("--root", default=ARCHIVE_DIR, help="Archive directory (default: Backup/archive)")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    import_parser = sub.add_parser("import", help="Import existing backups into the archive")
+    import_parser.add_argument("backup_dir", nargs="?", default="Backup")
+
+    list_parser = sub.add_parser("list", help="List the archived versions of a device")
+    list_parser.add_argument("ip")
+
+    restore_parser = sub.add_parser("restore", help="Rebuild a configuration (latest by default)")
+    restore_parser.add_argument("ip")
+    restore_parser.add_argument("--version", type=int, help="Version number from 'list'")
+    restore_parser.add_argument("--at", help="Configuration in effect at YYYYmmdd_HHMMSS")
+    restore_parser.add_argument("-o", "--output", help="Write to a file instead of stdout")
+
+    args = parser.parse_args()
+    archive = ConfigArchive(args.root)
+
+    if args.action == "import":
+        added = archive.import_backups(args.backup_dir)
+        print(f"✅ {added} versions added to {args.root}")
+
+    elif args.action == "list":
+        for number, entry in enumerate(archive.versions(args.ip)):
+            print(f"{number:>5}  {entry['timestamp']}  {entry['hash'][:12]}  {entry['kind']:<5}  {entry['length']} bytes")
+
+    elif args.action == "restore":
+        version = -1
+        if args.version is not None:
+            version = args.version
+        elif args.at:
+            version = archive.find(args.ip, args.at)
+            if version is None:
+                raise SystemExit(f"⛔ No configuration archived for {args.ip} before {args.at}")
+        config_output = archive.read(args.ip, version)
+        if args.output:
+            with open(args.output, "w") as file:
+                file.write(config_output)
+            print(f"✅ Configuration written to {args.output}")
+        else:
+            print(config_output, end="")
+
+
+if __name__ == "__main__":
+    main()
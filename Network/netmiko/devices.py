@@ -0,0 +1,229 @@
+######################################################
+#     DEVICE INVENTORY: PLATFORM, CREDENTIALS, TAGS  #
+######################################################
+
+import argparse
+import csv
+import fnmatch
+import json
+import os
+from getpass import getpass
+
+# YAML inventories need the optional "pyyaml" package
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Fields usable in filter expressions, with the indexed ones
+FILTER_FIELDS = ("ip", "platform", "port", "profile", "site", "tag")
+INDEXED_FIELDS = ("platform", "site", "tag")
+
+DEFAULT_PROFILE = "default"
+
+
+class Device(str):
+    """A device of the inventory.
+
+    A Device is its IP string, with the inventory columns as attributes, so
+    it can be used anywhere an IP is expected (file names, dict keys, sets).
+    device_type is None when the run's default device_type applies.
+    """
+
+    def __new__(cls, ip, device_type=None, port=22, profile=DEFAULT_PROFILE, site="", tags=()):
+        device = super().__new__(cls, ip.strip())
+        device.device_type = device_type or None
+        device.port = int(port or 22)
+        device.profile = profile or DEFAULT_PROFILE
+        device.site = site or ""
+        device.tags = tuple(tags)
+        return device
+
+    @property
+    def ip(self):
+        return str(self)
+
+    def value(self, field):
+        """Returns the values of a filter field for this device."""
+        if field == "tag":
+            return self.tags
+        if field == "platform":
+            return (self.device_type or "",)
+        return (str(getattr(self, field)),)
+
+
+def _split_tags(tags):
+    if isinstance(tags, str):
+        return [tag.strip() for tag in tags.replace("|", ";").split(";") if tag.strip()]
+    return [str(tag) for tag in tags or ()]
+
+
+def _device(row):
+    """Builds a Device from a dict of inventory columns."""
+    row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    return Device(
+        str(row.get("ip") or row.get("host") or ""),
+        device_type=row.get("platform") or row.get("device_type"),
+        port=row.get("port") or 22,
+        profile=row.get("profile"),
+        site=row.get("site"),
+        tags=_split_tags(row.get("tags") or row.get("tag") or ()),
+    )
+
+
+def read_devices(path):
+    """Reads an inventory file and returns the list of Device objects.
+
+    CSV files either have a header row (ip, platform, port, profile, site,
+    tags with ";" between tags) or one IP per line as before. JSON and YAML
+    files hold a list of objects with the same keys (or {"devices": [...]}).
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in (".json", ".yaml", ".yml"):
+        with open(path, "r") as file:
+            if extension == ".json":
+                data = json.load(file)
+            elif yaml is None:
+                raise RuntimeError("YAML inventories need the 'pyyaml' package (pip install pyyaml)")
+            else:
+                data = yaml.safe_load(file)
+        if isinstance(data, dict):
+            data = data.get("devices", [])
+        devices = [_device(row) for row in data]
+
+    else:
+        with open(path, mode="r", newline="") as file:
+            rows = [row for row in csv.reader(file) if row and row[0].strip()]
+        header = [column.strip().lower() for column in rows[0]] if rows else []
+        if "ip" in header or "host" in header:
+            devices = [_device(dict(zip(header, row))) for row in rows[1:]]
+        else:
+            devices = [Device(row[0]) for row in rows]
+
+    return [device for device in devices if device]
+
+
+class DeviceInventory:
+    """Devices of an inventory file, indexed by platform, site and tag.
+
+        inventory = DeviceInventory.load("devices.csv")
+        devices = inventory.select("site=paris and tag=core")
+    """
+
+    def __init__(self, devices):
+        self.devices = list(devices)
+        self.by_ip = {device.ip: device for device in self.devices}
+        self.index = {field: {} for field in INDEXED_FIELDS}
+        for device in self.devices:
+            for field in INDEXED_FIELDS:
+                for value in device.value(field):
+                    self.index[field].setdefault(value, []).append(device)
+
+    @classmethod
+    def load(cls, path):
+        return cls(read_devices(path))
+
+    def __len__(self):
+        return len(self.devices)
+
+    def get(self, ip):
+        return self.by_ip.get(ip)
+
+    def _parse_term(self, term):
+        negate = term.startswith("not ")
+        if negate:
+            term = term[4:].strip()
+        if "!=" in term:
+            field, values = term.split("!=", 1)
+            negate = not negate
+        elif "=" in term:
+            field, values = term.split("=", 1)
+        else:
+            raise ValueError(f"Invalid filter term {term!r}, expected field=value")
+
+        field = field.strip().lower()
+        if field in ("tags", "device_type"):
+            field = {"tags": "tag", "device_type": "platform"}[field]
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unknown filter field {field!r}, expected one of {', '.join(FILTER_FIELDS)}")
+        return field, [value.strip() for value in values.split(",")], negate
+
+    def _matches(self, device, field, patterns):
+        return any(fnmatch.fnmatchcase(value, pattern) for value in device.value(field) for pattern in patterns)
+
+    def _candidates(self, terms):
+        # An exact positive term on an indexed field narrows the scan to its index entries
+        for field, patterns, negate in terms:
+            if field in INDEXED_FIELDS and not negate and not any(set(p) & set("*?[") for p in patterns):
+                candidates = {}
+                for pattern in patterns:
+                    for device in self.index[field].get(pattern, []):
+                        candidates[device.ip] = device
+                return list(candidates.values())
+        return self.devices
+
+    def select(self, expression=None):
+        """Returns the devices matching a filter expression, in inventory order.
+
+        Terms are field=value (or field!=value, or "not field=value"),
+        combined with "and" / "or" ("and" binds tighter). A value may list
+        alternatives separated by commas and use * ? wildcards:
+
+            site=paris and tag=core,distribution
+            platform=aruba_aoscx or ip=10.20.*
+            tag=access and not site=lab
+        """
+        if not expression or not expression.strip():
+            return list(self.devices)
+
+        selected = set()
+        for group in expression.split(" or "):
+            terms = [self._parse_term(term.strip()) for term in group.split(" and ")]
+            for device in self._candidates(terms):
+                if all(self._matches(device, field, patterns) != negate for field, patterns, negate in terms):
+                    selected.add(device.ip)
+        return [device for device in self.devices if device.ip in selected]
+
+
+def load_devices(path, expression=None):
+    """Reads an inventory file and returns the devices matching the filter expression."""
+    print(f"\n👀 Reading devices from {path}...")
+    inventory = DeviceInventory.load(path)
+    devices = inventory.select(expression)
+    if expression:
+        print(f"👀 {len(devices)} of {len(inventory)} devices match '{expression}'.")
+    else:
+        print(f"👀 Found {len(devices)} devices in {path}.")
+    return devices
+
+
+def ask_credentials(devices, username, password):
+    """Prompts once for each credential profile used by the devices.
+
+    The login already typed is used for the "default" profile. Returns
+    {profile: (username, password)}.
+    """
+    credentials = {DEFAULT_PROFILE: (username, password)}
+    for device in devices:
+        profile = getattr(device, "profile", DEFAULT_PROFILE)
+        if profile not in credentials:
+            print(f"\n🔐 Credentials for profile '{profile}'")
+            credentials[profile] = (input("Login: "), getpass("Password: "))
+    return credentials
+
+
+def main():
+    """Command line listing of the devices matching a filter expression."""
+    parser = argparse.ArgumentParser(description="List the devices of an inventory file.")
+    parser.add_argument("path", help="Inventory file (.csv, .json, .yaml)")
+    parser.add_argument("filter", nargs="?", help='Filter expression, e.g. "site=paris and tag=core"')
+    args = parser.parse_args()
+
+    for device in DeviceInventory.load(args.path).select(args.filter):
+        print(f"{device.ip:<15} {device.device_type or '-':<15} {device.port:<5} {device.profile:<10} "
+              f"{device.site or '-':<10} {','.join(device.tags)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+######################################################
+#          SHARED NETMIKO EXECUTION ENGINE           #
+######################################################
+
+import csv
+import ipaddress
+import json
+import logging
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
+from netmiko import (
+    ConnectHandler,
+    NetmikoTimeoutException,
+    NetmikoAuthenticationException,
+    ReadTimeout
+)
+from facts import device_facts
+from metrics import run_metrics
+from preflight import sweep
+
+
+@dataclass
+class DeviceResult:
+    """Outcome of a task run against a single device."""
+    ip: str
+    ok: bool = False
+    value: object = None
+    error: str = ""
+    attempts: int = 0
+    elapsed: float = 0.0
+
+
+# Jittered exponential backoff before retry n: random wait in [0, min(cap, base * 2^(n-1))]
+BACKOFF_BASE = 2
+BACKOFF_CAP = 60
+
+
+class CircuitBreaker:
+    """Stops dialing a subnet after `threshold` consecutive connection timeouts.
+
+    Once open, the remaining devices of the subnet are skipped for the rest
+    of the run instead of each waiting for its own timeout.
+    """
+
+    def __init__(self, threshold=5, prefix=24):
+        self.threshold = threshold
+        self.prefix = prefix
+        self._timeouts = {}
+        self._lock = threading.Lock()
+
+    def _subnet(self, ip):
+        try:
+            return str(ipaddress.ip_network(f"{ip}/{self.prefix}", strict=False))
+        except ValueError:
+            # Hostnames are tracked on their own
+            return ip
+
+    def is_open(self, ip):
+        """Tells whether the subnet of ip is no longer dialed."""
+        if not self.threshold:
+            return False
+        with self._lock:
+            return self._timeouts.get(self._subnet(ip), 0) >= self.threshold
+
+    def record(self, ip, timed_out):
+        """Counts a timeout, or resets the subnet counter after a successful connection."""
+        subnet = self._subnet(ip)
+        with self._lock:
+            if not timed_out:
+                self._timeouts[subnet] = 0
+                return
+            self._timeouts[subnet] = self._timeouts.get(subnet, 0) + 1
+            opened = self.threshold and self._timeouts[subnet] == self.threshold
+        if opened:
+            print(f"🔌 {self.threshold} consecutive timeouts in {subnet}, skipping its remaining devices.")
+            logging.warning(f"🔌 Circuit open for {subnet} after {self.threshold} consecutive timeouts")
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Returns the wait before retry number `attempt` (1 for the first retry)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def read_failed(path):
+    """Returns {ip: error} for the devices that failed in the last run recorded in path."""
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_failed(results, path):
+    """Records the devices that failed, for a later retry-failed-only run."""
+    failed = {result.ip: result.error for result in results if not result.ok}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(failed, file, indent=2)
+    if failed:
+        print(f"📝 {len(failed)} failed devices saved to {path} (set retry_failed = True to rerun only them).")
+
+
+def read_csv(file_csv):
+    """Reads a CSV file and returns a list of switch IPs (1st column)."""
+    print(f"\n👀 Reading IP list from {file_csv}...")
+    ip_list = []
+
+    with open(file_csv, mode="r", newline="") as file:
+        csv_reader = csv.reader(file)
+        for row in csv_reader:
+            if not row:
+                continue
+            ip = row[0].strip()
+            if ip:
+                ip_list.append(ip)
+
+    print(f"👀 Found {len(ip_list)} IPs in {file_csv}.")
+    return ip_list
+
+
+def connect(ip, username, password, device_type="aruba_osswitch", timeout=30, keepalive=0, port=22):
+    """Opens a netmiko session with per-device timeouts (keepalive in seconds, 0 = off)."""
+    return ConnectHandler(
+        device_type=device_type,
+        host=ip,
+        port=port,
+        username=username,
+        password=password,
+        conn_timeout=timeout,
+        auth_timeout=timeout,
+        banner_timeout=timeout,
+        keepalive=keepalive
+    )
+
+
+def parse_hostname(config_output, default="unknown_hostname"):
+    """Extracts the hostname from a running-config (or a filtered 'hostname' line)."""
+    for line in config_output.splitlines():
+        parts = line.strip().split()
+        if len(parts) >= 2 and parts[0] == "hostname":
+            return parts[-1].strip('"')
+    return default
+
+
+def get_hostname(connection, ip=None, default="unknown_hostname"):
+    """Returns the hostname of a connected switch.
+
+    When ip is given, the cached hostname is used if known, which saves a
+    round trip to the switch; otherwise it is queried and cached.
+    """
+    if ip:
+        hostname = device_facts.get(ip, "hostname")
+        if hostname:
+            return hostname
+
+    hostname_output = connection.send_command("show running-config | include hostname")
+    hostname = parse_hostname(hostname_output or "", default=default)
+
+    if ip:
+        device_facts.update(ip, hostname=hostname)
+    return hostname
+
+
+def iter_command_output(connection, command, read_timeout=120, delay=0.1):
+    """Yields the output of a command in chunks, as they arrive from the channel.
+
+    Only complete lines are yielded and at most one partial line is kept in
+    memory, so large outputs can be written to disk without buffering them.
+    The command echo and the trailing prompt are stripped. read_timeout is
+    the maximum silence allowed between two chunks.
+    """
+    prompt = connection.base_prompt
+    connection.clear_buffer()
+    connection.write_channel(command + connection.RETURN)
+
+    pending = ""
+    echo_skipped = False
+    deadline = time.monotonic() + read_timeout
+
+    while True:
+        chunk = connection.read_channel()
+        if not chunk:
+            if time.monotonic() > deadline:
+                raise ReadTimeout(f"No output from '{command}' for {read_timeout}s")
+            time.sleep(delay)
+            continue
+
+        deadline = time.monotonic() + read_timeout
+        pending += chunk.replace("\r\n", "\n").replace("\r", "")
+
+        # The first line is the echo of the command itself
+        if not echo_skipped:
+            if "\n" not in pending:
+                continue
+            pending = pending.split("\n", 1)[1]
+            echo_skipped = True
+
+        cut = pending.rfind("\n")
+        last_line = pending[cut + 1:]
+
+        # Output ends when the prompt comes back on the last line
+        if last_line.strip().startswith(prompt) and last_line.rstrip().endswith(("#", ">")):
+            if cut >= 0:
+                yield pending[:cut + 1]
+            return
+
+        if cut >= 0:
+            yield pending[:cut + 1]
+            pending = last_line
+
+
+def device_settings(ip, username, password, device_type, credentials=None):
+    """Returns (device_type, port, username, password) for an IP or a devices.Device.
+
+    A Device brings its own platform, SSH port and credential profile;
+    credentials maps profile names to (username, password).
+    """
+    device_type = getattr(ip, "device_type", None) or device_type
+    port = getattr(ip, "port", 22)
+    if credentials:
+        username, password = credentials.get(getattr(ip, "profile", None), (username, password))
+    return device_type, port, username, password
+
+
+def run_device(ip, task, username, password, device_type="aruba_osswitch", timeout=30, retries=0, pool=None,
+               breaker=None, credentials=None):
+    """Connects to one device, runs task(connection, ip) and returns a DeviceResult.
+
+    Timeouts are retried up to `retries` times after a jittered exponential
+    backoff; authentication failures and task errors are not. Devices in a
+    subnet where the CircuitBreaker is open are skipped. With a SessionPool,
+    the session is taken from and given back to the pool instead of being
+    opened and closed.
+    """
+    result = DeviceResult(ip=ip)
+    start = time.monotonic()
+    run_metrics.bind(ip)
+    device_type, port, username, password = device_settings(ip, username, password, device_type, credentials)
+
+    while result.attempts <= retries:
+        if breaker and breaker.is_open(ip):
+            result.error = result.error or "skipped (subnet unreachable)"
+            logging.info(f"🔌 Skipping {ip}, circuit open for its subnet")
+            break
+
+        if result.attempts:
+            delay = backoff_delay(result.attempts)
+            logging.info(f"⏳ Retrying {ip} in {delay:.1f}s")
+            time.sleep(delay)
+
+        result.attempts += 1
+        try:
+            print(f"\n🌐 Connecting to switch {ip}...")
+            logging.info(f"🌐 Connecting to switch {ip}")
+
+            # netmiko does the TCP connection, SSH handshake and authentication in one call
+            with run_metrics.timed("login"):
+                if pool is None:
+                    connection = connect(ip, username, password, device_type=device_type, timeout=timeout, port=port)
+                else:
+                    connection = pool.acquire(ip, username, password, device_type=device_type, timeout=timeout,
+                                              port=port)
+            logging.info(f"✅ Successfully connected to {ip}")
+            if breaker:
+                breaker.record(ip, timed_out=False)
+
+            healthy = False
+            try:
+                result.value = task(connection, ip)
+                healthy = True
+            finally:
+                if pool is None:
+                    connection.disconnect()
+                else:
+                    pool.release(connection, healthy=healthy)
+
+            result.ok = True
+            result.error = ""
+            break
+
+        except NetmikoTimeoutException:
+            result.error = "timeout"
+            print(f"⛔ ERROR: Timeout while connecting to {ip}")
+            logging.error(f"⛔ Timeout while connecting to {ip} (attempt {result.attempts})")
+            if breaker:
+                breaker.record(ip, timed_out=True)
+
+        except NetmikoAuthenticationException:
+            result.error = "authentication failed"
+            print(f"⛔ ERROR: Authentication failed for {ip}")
+            logging.error(f"⛔ Authentication failed for {ip}")
+            break
+
+        except Exception as e:
+            result.error = str(e)
+            print(f"⛔ Unexpected error with {ip}: {str(e)}")
+            logging.error(f"⛔ Unexpected error with {ip}: {str(e)}")
+            break
+
+    result.elapsed = time.monotonic() - start
+    run_metrics.record(ip, "total", result.elapsed)
+    return result
+
+
+def run_devices(ip_list, task, username, password, device_type="aruba_osswitch",
+                max_workers=10, timeout=30, retries=0, save_facts=True, pool=None, breaker_threshold=5,
+                preflight="last", credentials=None):
+    """Runs task(connection, ip) on every device with a bounded worker pool.
+
+    ip_list holds IPs or devices.Device objects; a Device overrides
+    device_type and the SSH port, and picks its login from credentials
+    ({profile: (username, password)}) when given.
+
+    pool is an optional SessionPool, to reuse the sessions across several
+    calls. A subnet is skipped after breaker_threshold consecutive timeouts
+    (0 disables it). preflight checks the SSH port of every device first:
+    "last" runs the unreachable devices after the others, "skip" does not
+    run them, None disables the check. Returns the list of DeviceResult
+    objects in the order of ip_list.
+    """
+    print(f"⚙️  Running with {max_workers} concurrent workers (timeout {timeout}s per device).")
+    results = {}
+    breaker = CircuitBreaker(threshold=breaker_threshold)
+
+    # Dead devices no longer hold workers while reachable ones wait
+    to_run = ip_list
+    if preflight and ip_list:
+        reachable, unreachable = sweep(ip_list, ports={ip: getattr(ip, "port", 22) for ip in ip_list})
+        if preflight == "skip":
+            to_run = reachable
+            for ip in unreachable:
+                results[ip] = DeviceResult(ip=ip, error="unreachable (pre-flight)")
+        else:
+            to_run = reachable + unreachable
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(run_device, ip, task, username, password, device_type, timeout, retries, pool,
+                            breaker, credentials): ip
+            for ip in to_run
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    # Persist the facts learnt during the run (hostnames, models, ...)
+    if save_facts:
+        device_facts.save()
+
+    return [results[ip] for ip in ip_list]
+
+
+def _init_shard(log_queue):
+    # Child processes send their log records to the parent, which writes them
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+
+
+def _run_shard(shard, task, username, password, device_type, max_workers, timeout, retries, breaker_threshold,
+               preflight, credentials):
+    results = run_devices(
+        shard, task, username, password,
+        device_type=device_type,
+        max_workers=max_workers,
+        timeout=timeout,
+        retries=retries,
+        save_facts=False,
+        breaker_threshold=breaker_threshold,
+        preflight=preflight,
+        credentials=credentials
+    )
+    return results, device_facts.dirty(), run_metrics.samples()
+
+
+def run_devices_sharded(ip_list, task, username, password, device_type="aruba_osswitch",
+                        processes=None, max_workers=10, timeout=30, retries=0, breaker_threshold=5,
+                        preflight="last", credentials=None):
+    """Splits the devices into shards, each run by run_devices in its own process.
+
+    CPU-bound work done by the task (parsing, hashing, compression) is then
+    spread over the cores. The task and its return value must be picklable.
+    Log records and learnt facts are merged in the parent. Returns the
+    DeviceResult objects in the order of ip_list.
+    """
+    processes = max(1, min(processes or os.cpu_count() or 1, len(ip_list)))
+    shards = [ip_list[index::processes] for index in range(processes)]
+    print(f"⚙️  Sharding {len(ip_list)} devices over {processes} processes.")
+
+    manager = multiprocessing.Manager()
+    log_queue = manager.Queue()
+    listener = QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+    listener.start()
+
+    results = {}
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_shard, initargs=(log_queue,)) as executor:
+            futures = [
+                executor.submit(_run_shard, shard, task, username, password, device_type,
+                                max_workers, timeout, retries, breaker_threshold, preflight, credentials)
+                for shard in shards
+            ]
+            for future in as_completed(futures):
+                shard_results, facts, timings = future.result()
+                for result in shard_results:
+                    results[result.ip] = result
+                device_facts.merge(facts)
+                run_metrics.merge(timings)
+    finally:
+        listener.stop()
+        manager.shutdown()
+
+    device_facts.save()
+    return [results[ip] for ip in ip_list]
+
+
+def print_summary(results):
+    """Prints and logs the final success/failure summary of a bulk run."""
+    succeeded = [r for r in results if r.ok]
+    failed = [r for r in results if not r.ok]
+
+    print(f"\n📊 Summary: {len(succeeded)} succeeded, {len(failed)} failed.")
+    logging.info(f"📊 Summary: {len(succeeded)} succeeded, {len(failed)} failed")
+    for result in failed:
+        print(f"   ⛔ {result.ip}: {result.error}")
+        logging.info(f"⛔ Failed: {result.ip} ({result.error})")
@@ -0,0 +1,73 @@
+######################################################
+#          PERSISTENT PER-DEVICE FACTS CACHE         #
+######################################################
+
+import json
+import os
+import threading
+from datetime import datetime
+
+FACTS_FILE = os.path.join("Cache", "device_facts.json")
+
+
+class FactsCache:
+    """Thread-safe cache of device facts (hostname, model, ...) persisted as JSON."""
+
+    def __init__(self, path=FACTS_FILE):
+        self.path = path
+        self._facts = None
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Loaded lazily so importing a script does not touch the disk
+        if self._facts is None:
+            try:
+                with open(self.path, "r") as file:
+                    self._facts = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._facts = {}
+        return self._facts
+
+    def get(self, ip, key, default=None):
+        """Returns a cached fact for a device, or default if unknown."""
+        with self._lock:
+            return self._load().get(ip, {}).get(key, default)
+
+    def update(self, ip, **facts):
+        """Stores facts for a device; 'Unknown'/empty values are ignored."""
+        facts = {k: v for k, v in facts.items() if v and v not in ("Unknown", "unknown_hostname")}
+        if not facts:
+            return
+        with self._lock:
+            entry = self._load().setdefault(ip, {})
+            entry.update(facts)
+            entry["updated"] = datetime.now().isoformat(timespec="seconds")
+            self._dirty.add(ip)
+
+    def dirty(self):
+        """Returns {ip: facts} for the devices updated since the cache was loaded."""
+        with self._lock:
+            return {ip: dict(self._load()[ip]) for ip in self._dirty}
+
+    def merge(self, facts):
+        """Applies facts learnt elsewhere (e.g. in a child process), as returned by dirty()."""
+        with self._lock:
+            for ip, entry in facts.items():
+                self._load().setdefault(ip, {}).update(entry)
+                self._dirty.add(ip)
+
+    def save(self):
+        """Writes the cache to disk atomically."""
+        with self._lock:
+            if self._facts is None:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(self._facts, file, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+# Shared instance used by every Script4* script
+device_facts = FactsCache()
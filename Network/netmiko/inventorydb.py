@@ -0,0 +1,187 @@
+######################################################
+#     INVENTORY DATABASE WITH CHANGE DETECTION       #
+######################################################
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+INVENTORY_DB = os.path.join("SwitchInventory", "inventory.db")
+
+# Fields that change on their own and are not reported as changes
+VOLATILE_FIELDS = ("Uptime",)
+
+# Labels for the changes worth a specific mention
+CHANGE_LABELS = {
+    "Serial Number": "hardware replaced",
+    "Firmware Version": "firmware change",
+    "Model": "model change",
+    "Last Reboot": "reboot",
+}
+
+
+class InventoryDB:
+    """Last known inventory record and last-seen time per device, plus a change history.
+
+    Devices are keyed by IP; the serial number is indexed so a chassis moving
+    to another IP can be recognised.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS devices (
+            ip TEXT PRIMARY KEY,
+            serial TEXT,
+            record TEXT NOT NULL,
+            last_seen TEXT NOT NULL,
+            flagged INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS devices_serial ON devices(serial);
+        CREATE TABLE IF NOT EXISTS changes (
+            id INTEGER PRIMARY KEY,
+            ip TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            field TEXT NOT NULL,
+            old TEXT,
+            new TEXT
+        );
+        CREATE INDEX IF NOT EXISTS changes_ts ON changes(ts);
+        CREATE INDEX IF NOT EXISTS changes_ip_ts ON changes(ip, ts);
+    """
+
+    def __init__(self, path=INVENTORY_DB):
+        self.path = path
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # A connection inherited from a parent process (sharded runs) is not reused
+        if self._db is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._pid = os.getpid()
+            self._db.executescript(self.SCHEMA)
+        return self._db
+
+    def records(self, ip_list):
+        """Returns {ip: record} for the devices of ip_list already in the database."""
+        with self._lock:
+            rows = self._connect().execute("SELECT ip, record FROM devices").fetchall()
+        wanted = set(ip_list)
+        return {ip: json.loads(record) for ip, record in rows if ip in wanted}
+
+    def to_poll(self, ip_list, max_age_hours=168):
+        """Returns the devices of ip_list that are unknown, flagged or not seen for max_age_hours."""
+        limit = (datetime.now() - timedelta(hours=max_age_hours)).isoformat(timespec="seconds")
+        with self._lock:
+            rows = self._connect().execute("SELECT ip, last_seen, flagged FROM devices").fetchall()
+        fresh = {ip for ip, last_seen, flagged in rows if last_seen >= limit and not flagged}
+        return [ip for ip in ip_list if ip not in fresh]
+
+    def flag(self, ip_list):
+        """Forces a re-poll of devices on the next run."""
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.executemany("UPDATE devices SET flagged = 1 WHERE ip = ?", [(ip,) for ip in ip_list])
+
+    def update(self, ip, record):
+        """Stores a fresh record and returns the list of changes (field, old, new)."""
+        now = datetime.now().isoformat(timespec="seconds")
+        serial = record.get("Serial Number")
+        serial = serial if serial and serial != "Unknown" else None
+
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT record FROM devices WHERE ip = ?", (ip,)).fetchone()
+            changes = []
+
+            if row:
+                previous = json.loads(row[0])
+                for field, value in record.items():
+                    old = previous.get(field)
+                    if field not in VOLATILE_FIELDS and old != value and value != "Unknown":
+                        changes.append((field, old, value))
+            elif serial:
+                # New IP for a known chassis
+                moved = db.execute("SELECT ip FROM devices WHERE serial = ? AND ip != ?", (serial, ip)).fetchone()
+                if moved:
+                    changes.append(("IP Address", moved[0], ip))
+
+            with db:
+                db.execute(
+                    "INSERT INTO devices (ip, serial, record, last_seen, flagged) VALUES (?, ?, ?, ?, 0) "
+                    "ON CONFLICT(ip) DO UPDATE SET serial = excluded.serial, record = excluded.record, "
+                    "last_seen = excluded.last_seen, flagged = 0",
+                    (ip, serial, json.dumps(record), now)
+                )
+                db.executemany(
+                    "INSERT INTO changes (ip, ts, field, old, new) VALUES (?, ?, ?, ?, ?)",
+                    [(ip, now, field, old, new) for field, old, new in changes]
+                )
+
+        return changes
+
+    def changes(self, ip=None, since=None):
+        """Returns recorded changes (ip, ts, field, old, new), newest first."""
+        sql, params = "SELECT ip, ts, field, old, new FROM changes WHERE ts >= ?", [since.isoformat() if since else ""]
+        if ip:
+            sql += " AND ip = ?"
+            params.append(ip)
+        with self._lock:
+            return self._connect().execute(sql + " ORDER BY ts DESC", params).fetchall()
+
+
+def describe_change(field, old, new):
+    """Formats a change for display."""
+    label = CHANGE_LABELS.get(field, "change")
+    return f"{label}: {field} {old} -> {new}"
+
+
+# Shared instance used by the Script4* scripts
+inventory_db = InventoryDB()
+
+
+def main():
+    """Command line access to the inventory database: flag, changes and show."""
+    parser = argparse.ArgumentParser(description="Switch inventory database.")
+    parser.add_argument("--db", default=INVENTORY_DB, help="SQLite database (default: SwitchInventory/inventory.db)")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    flag_parser = sub.add_parser("flag", help="Re-poll these devices on the next run")
+    flag_parser.add_argument("ips", nargs="+")
+
+    changes_parser = sub.add_parser("changes", help="List detected changes")
+    changes_parser.add_argument("--ip")
+    changes_parser.add_argument("--days", type=int, default=30, help="Look back N days (default: 30)")
+
+    show_parser = sub.add_parser("show", help="Print the last known record of a device")
+    show_parser.add_argument("ip")
+
+    args = parser.parse_args()
+    db = InventoryDB(args.db)
+
+    if args.action == "flag":
+        db.flag(args.ips)
+        print(f"✅ {len(args.ips)} devices flagged for the next run")
+
+    elif args.action == "changes":
+        rows = db.changes(ip=args.ip, since=datetime.now() - timedelta(days=args.days))
+        for ip, ts, field, old, new in rows:
+            print(f"{ts}  {ip:<15} {describe_change(field, old, new)}")
+        print(f"\n👀 {len(rows)} changes")
+
+    elif args.action == "show":
+        record = db.records([args.ip]).get(args.ip)
+        if not record:
+            print(f"⛔ {args.ip} is not in the inventory")
+            return
+        for field, value in record.items():
+            print(f"{field:<18} {value}")
+
+
+if __name__ == "__main__":
+    main()
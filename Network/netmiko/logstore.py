@@ -0,0 +1,368 @@
+######################################################
+#       SWITCH LOG STORE: MARKS, ROTATION, INDEX     #
+######################################################
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+LOGS_DIR = "Logs"
+MARKS_FILE = os.path.join(LOGS_DIR, "marks.json")
+INDEX_FILE = os.path.join(LOGS_DIR, "logs.db")
+
+# Rows inserted per transaction while ingesting
+INGEST_BATCH = 1000
+
+# Aruba OS-Switch: "I 03/01/26 10:15:30 00076 ports: port 1 is now on-line"
+OSSWITCH_LINE = re.compile(
+    r"^(?P<severity>[IWEMD])\s+(?P<date>\d{2}/\d{2}/\d{2})\s+(?P<time>\d{2}:\d{2}:\d{2})\s+"
+    r"(?P<event_id>\d+)\s+(?P<message>.*)$"
+)
+
+# Aruba AOS-CX: "2026-03-01T10:15:30.123456+00:00 SW01 lldpd[1234]: Event|1234|LOG_INFO|AMM|1/1|Port 1/1/1 up"
+AOSCX_LINE = re.compile(
+    r"^(?P<timestamp>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})\S*\s+\S+\s+[^:]+:\s+"
+    r"(?:Event\|(?P<event_id>\d+)\|LOG_(?P<severity>[A-Z]+)\|[^|]*\|[^|]*\|)?(?P<message>.*)$"
+)
+
+
+def parse_log_line(line):
+    """Parses an Aruba log line into a dict (timestamp, severity, event_id, message), or None."""
+    match = OSSWITCH_LINE.match(line)
+    if match:
+        try:
+            timestamp = datetime.strptime(f"{match['date']} {match['time']}", "%m/%d/%y %H:%M:%S")
+        except ValueError:
+            return None
+        return {
+            "timestamp": timestamp,
+            "severity": match["severity"],
+            "event_id": str(int(match["event_id"])),
+            "message": match["message"].strip(),
+        }
+
+    match = AOSCX_LINE.match(line)
+    if match:
+        try:
+            timestamp = datetime.strptime(match["timestamp"], "%Y-%m-%dT%H:%M:%S")
+        except ValueError:
+            return None
+        return {
+            "timestamp": timestamp,
+            "severity": (match["severity"] or "INFO")[0],
+            "event_id": match["event_id"] or "",
+            "message": match["message"].strip(),
+        }
+
+    return None
+
+
+def _line_hash(line):
+    return hashlib.sha1(line.encode("utf-8")).hexdigest()[:16]
+
+
+class LogMarks:
+    """Thread-safe per-device high-water marks, persisted as JSON.
+
+    A mark is the timestamp of the newest collected entry plus the hashes of
+    the entries sharing that timestamp (several events can occur within the
+    same second).
+    """
+
+    def __init__(self, path=MARKS_FILE):
+        self.path = path
+        self._marks = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._marks is None:
+            try:
+                with open(self.path, "r") as file:
+                    self._marks = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._marks = {}
+        return self._marks
+
+    def get(self, ip):
+        """Returns the mark of a device, or None on the first collection."""
+        with self._lock:
+            return self._load().get(ip)
+
+    def set(self, ip, mark):
+        with self._lock:
+            if mark:
+                self._load()[ip] = mark
+
+    def save(self):
+        """Writes the marks to disk atomically."""
+        with self._lock:
+            if self._marks is None:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(self._marks, file, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+class NewLinesFilter:
+    """Keeps only the log lines newer than a device's high-water mark.
+
+    Logs are listed oldest first, so each line is compared with the mark as
+    it streams by. Lines without a timestamp (headers, continuations) follow
+    the decision taken for the previous entry. After iteration, `mark` holds
+    the new high-water mark.
+    """
+
+    def __init__(self, mark=None):
+        self.mark_time = mark["timestamp"] if mark else ""
+        self.mark_seen = set(mark["seen"]) if mark else set()
+        self.mark = mark
+        self.new_lines = 0
+        self._newest_time = self.mark_time
+        self._newest_seen = set(self.mark_seen)
+
+    def _is_new(self, line, entry):
+        timestamp = entry["timestamp"].isoformat()
+        digest = _line_hash(line)
+
+        if timestamp > self._newest_time:
+            self._newest_time, self._newest_seen = timestamp, {digest}
+        elif timestamp == self._newest_time:
+            self._newest_seen.add(digest)
+
+        if timestamp > self.mark_time:
+            return True
+        return timestamp == self.mark_time and digest not in self.mark_seen
+
+    def lines(self, chunks):
+        """Yields the new lines found in an iterable of text chunks."""
+        keep = False
+        pending = ""
+        for chunk in chunks:
+            pending += chunk
+            *complete, pending = pending.split("\n")
+            for line in complete:
+                entry = parse_log_line(line)
+                if entry:
+                    keep = self._is_new(line, entry)
+                if keep:
+                    self.new_lines += 1
+                    yield line + "\n"
+        if pending:
+            entry = parse_log_line(pending)
+            if entry:
+                keep = self._is_new(pending, entry)
+            if keep:
+                self.new_lines += 1
+                yield pending + "\n"
+
+        if self._newest_time:
+            self.mark = {"timestamp": self._newest_time, "seen": sorted(self._newest_seen)}
+
+
+class RollingLog:
+    """Per-device log file appended to on each run and rotated by size.
+
+    Logs/<ip>.log is renamed to <ip>.log.1 (and so on up to backup_count)
+    once it exceeds max_bytes.
+    """
+
+    def __init__(self, ip, root=LOGS_DIR, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.path = os.path.join(root, f"{ip}.log")
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+    def _rotate(self):
+        for number in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{number}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{number + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def append(self, lines):
+        """Appends an iterable of lines, rotating first if the file is too large."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self.backup_count > 0 and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+        with open(self.path, "a") as file:
+            for line in lines:
+                file.write(line)
+        return self.path
+
+
+class LogIndex:
+    """Structured log records in SQLite, indexed by device, time, severity and event ID."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY,
+            device TEXT NOT NULL,
+            hostname TEXT,
+            ts TEXT NOT NULL,
+            severity TEXT,
+            event_id TEXT,
+            message TEXT,
+            line_hash TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS logs_unique ON logs(device, ts, line_hash);
+        CREATE INDEX IF NOT EXISTS logs_ts ON logs(ts);
+        CREATE INDEX IF NOT EXISTS logs_severity_ts ON logs(severity, ts);
+        CREATE INDEX IF NOT EXISTS logs_event_ts ON logs(event_id, ts);
+    """
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Opened lazily and shared by the worker threads (writes go through the lock)
+        # A connection inherited from a parent process (sharded runs) is not reused
+        if self._db is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._pid = os.getpid()
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(self.SCHEMA)
+        return self._db
+
+    def _insert(self, rows):
+        if not rows:
+            return
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.executemany(
+                    "INSERT OR IGNORE INTO logs (device, hostname, ts, severity, event_id, message, line_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+
+    def tee(self, device, hostname, lines):
+        """Yields the lines unchanged while indexing the parsable ones in batches."""
+        rows = []
+        for line in lines:
+            entry = parse_log_line(line.rstrip("\n"))
+            if entry:
+                rows.append((
+                    device, hostname, entry["timestamp"].isoformat(), entry["severity"],
+                    entry["event_id"], entry["message"], _line_hash(line.rstrip("\n"))
+                ))
+                if len(rows) >= INGEST_BATCH:
+                    self._insert(rows)
+                    rows = []
+            yield line
+        self._insert(rows)
+
+    def ingest_file(self, path, device, hostname=""):
+        """Indexes an existing log file (plain or .gz); already indexed entries are ignored."""
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as file:
+            for _ in self.tee(device, hostname, file):
+                pass
+
+    def query(self, device=None, since=None, until=None, severity=None, event_id=None, contains=None, limit=1000):
+        """Returns matching records (ts, device, hostname, severity, event_id, message), newest first."""
+        clauses, params = [], []
+        if device:
+            clauses.append("device = ?")
+            params.append(device)
+        if since:
+            clauses.append("ts >= ?")
+            params.append(since.isoformat())
+        if until:
+            clauses.append("ts <= ?")
+            params.append(until.isoformat())
+        if severity:
+            clauses.append(f"severity IN ({', '.join('?' * len(severity))})")
+            params.extend(severity)
+        if event_id:
+            clauses.append("event_id = ?")
+            params.append(str(int(event_id)) if event_id.isdigit() else event_id)
+        if contains:
+            clauses.append("message LIKE ?")
+            params.append(f"%{contains}%")
+
+        sql = "SELECT ts, device, hostname, severity, event_id, message FROM logs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+
+# Shared instances used by the Script4* scripts
+log_marks = LogMarks()
+log_index = LogIndex()
+
+
+# Log files: Logs/<ip>.log[.N] or Logs/<ip>_<hostname>_logs_<timestamp>.log[.gz]
+LOG_FILE = re.compile(r"^(?P<ip>[^_]+?)(?:_(?P<hostname>.*)_logs_\d{8}_\d{6})?\.log(?:\.\d+|\.gz)?$")
+
+
+def parse_since(value):
+    """Converts '24h', '7d', '30m' or an ISO date/time into a datetime."""
+    match = re.fullmatch(r"(\d+)([mhd])", value)
+    if match:
+        unit = {"m": "minutes", "h": "hours", "d": "days"}[match[2]]
+        return datetime.now() - timedelta(**{unit: int(match[1])})
+    return datetime.fromisoformat(value)
+
+
+def main():
+    """Command line access to the log index: ingest and query."""
+    parser = argparse.ArgumentParser(description="Indexed store of switch logs.")
+    parser.add_argument("--db", default=INDEX_FILE, help="SQLite index (default: Logs/logs.db)")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    ingest_parser = sub.add_parser("ingest", help="Index existing log files")
+    ingest_parser.add_argument("files", nargs="+", help="Logs/<ip>.log or Logs/<ip>_<hostname>_logs_<ts>.log[.gz]")
+
+    query_parser = sub.add_parser("query", help="Search indexed logs")
+    query_parser.add_argument("--device", help="Device IP")
+    query_parser.add_argument("--since", help="Start: 30m, 24h, 7d or ISO date/time")
+    query_parser.add_argument("--until", help="End: ISO date/time")
+    query_parser.add_argument("--severity", help="Severity letters, e.g. WE for warnings and errors")
+    query_parser.add_argument("--event", help="Event ID")
+    query_parser.add_argument("--contains", help="Text contained in the message")
+    query_parser.add_argument("--limit", type=int, default=1000)
+
+    args = parser.parse_args()
+    index = LogIndex(args.db)
+
+    if args.action == "ingest":
+        for path in args.files:
+            match = LOG_FILE.match(os.path.basename(path))
+            if not match:
+                print(f"⛔ Skipping {path}: cannot tell the device from the file name")
+                continue
+            index.ingest_file(path, match["ip"], match["hostname"] or "")
+            print(f"✅ Indexed {path}")
+
+    elif args.action == "query":
+        rows = index.query(
+            device=args.device,
+            since=parse_since(args.since) if args.since else None,
+            until=datetime.fromisoformat(args.until) if args.until else None,
+            severity=list(args.severity.upper()) if args.severity else None,
+            event_id=args.event,
+            contains=args.contains,
+            limit=args.limit
+        )
+        for ts, device, hostname, severity, event_id, message in rows:
+            print(f"{ts}  {device:<15} {hostname or '':<20} {severity}  {event_id or '-':>5}  {message}")
+        print(f"\n👀 {len(rows)} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+######################################################
+#       PER-DEVICE PHASE TIMINGS AND METRICS EXPORT  #
+######################################################
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+METRICS_DIR = "Metrics"
+
+# Phases in report order: TCP handshake (pre-flight), SSH login, commands, disk writes, whole device
+PHASES = ("tcp", "login", "command", "write", "total")
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class RunMetrics:
+    """Thread-safe per-device, per-phase timings of a run.
+
+    The engine binds the current device to each worker thread, so a task
+    only has to wrap its steps:
+
+        with run_metrics.timed("command"):
+            output = connection.send_command("show version")
+    """
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def bind(self, ip):
+        """Sets the device timed by timed() in the calling thread."""
+        self._local.ip = ip
+
+    def record(self, ip, phase, seconds):
+        """Adds a duration to a phase of a device."""
+        with self._lock:
+            phases = self._samples.setdefault(ip, {})
+            phases[phase] = phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def timed(self, phase, ip=None):
+        """Times the enclosed block as a phase of the bound (or given) device."""
+        ip = ip or getattr(self._local, "ip", None)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            if ip:
+                self.record(ip, phase, time.monotonic() - start)
+
+    def samples(self):
+        """Returns a copy of {ip: {phase: seconds}}."""
+        with self._lock:
+            return {ip: dict(phases) for ip, phases in self._samples.items()}
+
+    def merge(self, samples):
+        """Adds timings measured elsewhere (e.g. in a child process), as returned by samples()."""
+        for ip, phases in samples.items():
+            for phase, seconds in phases.items():
+                self.record(ip, phase, seconds)
+
+    def summary(self):
+        """Returns {phase: {"count", "sum", "max", quantiles...}} over the devices."""
+        samples = self.samples()
+        summary = {}
+        for phase in PHASES:
+            values = [phases[phase] for phases in samples.values() if phase in phases]
+            if not values:
+                continue
+            stats = {"count": len(values), "sum": sum(values), "max": max(values)}
+            for q in QUANTILES:
+                stats[f"p{round(q * 100)}"] = percentile(values, q)
+            summary[phase] = stats
+        return summary
+
+    def report(self, name, results, directory=METRICS_DIR):
+        """Prints the percentile summary and exports the run.
+
+        Writes Metrics/<name>_<timestamp>.jsonl (one line per device) and
+        Metrics/netmiko_<name>.prom for the node_exporter textfile collector.
+        """
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.now()
+        samples = self.samples()
+        summary = self.summary()
+
+        jsonl_path = os.path.join(directory, f"{name}_{timestamp.strftime('%Y%m%d_%H%M%S')}.jsonl")
+        with open(jsonl_path, "w") as file:
+            for result in results:
+                row = {
+                    "run": timestamp.isoformat(timespec="seconds"),
+                    "ip": result.ip,
+                    "ok": result.ok,
+                    "error": result.error,
+                    "attempts": result.attempts,
+                }
+                row.update({phase: round(seconds, 3) for phase, seconds in samples.get(result.ip, {}).items()})
+                file.write(json.dumps(row) + "\n")
+
+        self._write_prometheus(name, results, summary, timestamp, directory)
+
+        print("\n⏱️  Timings (s)      p50      p90      p99      max")
+        for phase, stats in summary.items():
+            print(f"   {phase:<12} {stats['p50']:>8.2f} {stats['p90']:>8.2f} {stats['p99']:>8.2f} {stats['max']:>8.2f}")
+            logging.info(f"⏱️ {phase}: p50 {stats['p50']:.2f}s p90 {stats['p90']:.2f}s "
+                         f"p99 {stats['p99']:.2f}s max {stats['max']:.2f}s")
+
+        slowest = sorted(samples.items(), key=lambda item: item[1].get("total", 0), reverse=True)[:5]
+        if slowest:
+            print("   Slowest: " + ", ".join(f"{ip} ({phases.get('total', 0):.1f}s)" for ip, phases in slowest))
+        print(f"⏱️  Metrics written to {jsonl_path}")
+
+    def _write_prometheus(self, name, results, summary, timestamp, directory):
+        labels = f'script="{name}"'
+        lines = [
+            "# HELP netmiko_phase_seconds Per-device time spent in each phase during the last run.",
+            "# TYPE netmiko_phase_seconds summary",
+        ]
+        for phase, stats in summary.items():
+            for q in QUANTILES:
+                lines.append(f'netmiko_phase_seconds{{{labels},phase="{phase}",quantile="{q}"}} '
+                             f'{stats[f"p{round(q * 100)}"]:.6f}')
+            lines.append(f'netmiko_phase_seconds_sum{{{labels},phase="{phase}"}} {stats["sum"]:.6f}')
+            lines.append(f'netmiko_phase_seconds_count{{{labels},phase="{phase}"}} {stats["count"]}')
+
+        succeeded = sum(1 for result in results if result.ok)
+        lines += [
+            "# HELP netmiko_devices Devices of the last run by outcome.",
+            "# TYPE netmiko_devices gauge",
+            f'netmiko_devices{{{labels},status="ok"}} {succeeded}',
+            f'netmiko_devices{{{labels},status="failed"}} {len(results) - succeeded}',
+            "# HELP netmiko_last_run_timestamp_seconds End time of the last run.",
+            "# TYPE netmiko_last_run_timestamp_seconds gauge",
+            f"netmiko_last_run_timestamp_seconds{{{labels}}} {timestamp.timestamp():.0f}",
+        ]
+
+        # Written atomically, the textfile collector may read it at any time
+        path = os.path.join(directory, f"netmiko_{name}.prom")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+
+# Shared instance used by the engines and the Script4* scripts
+run_metrics = RunMetrics()
@@ -0,0 +1,73 @@
+######################################################
+#       PRE-FLIGHT TCP REACHABILITY SWEEP (SSH)      #
+######################################################
+
+import argparse
+import asyncio
+import logging
+import time
+
+from metrics import run_metrics
+
+
+async def _probe(ip, port, timeout, semaphore):
+    async with semaphore:
+        start = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        run_metrics.record(ip, "tcp", time.monotonic() - start)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
+
+async def _sweep(ip_list, port, ports, timeout, max_concurrency):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    return await asyncio.gather(*(_probe(ip, ports.get(ip, port), timeout, semaphore) for ip in ip_list))
+
+
+def sweep(ip_list, port=22, timeout=3, max_concurrency=500, ports=None):
+    """Checks in parallel which devices accept a TCP connection on the SSH port.
+
+    Only the TCP handshake is made, no SSH login, so thousands of devices
+    are checked in a few seconds. ports optionally maps an IP to its own SSH
+    port. Returns (reachable, unreachable), both in the order of ip_list.
+    """
+    start = time.monotonic()
+    ok = asyncio.run(_sweep(ip_list, port, ports or {}, timeout, max_concurrency))
+    reachable = [ip for ip, up in zip(ip_list, ok) if up]
+    unreachable = [ip for ip, up in zip(ip_list, ok) if not up]
+
+    elapsed = time.monotonic() - start
+    print(f"📡 Pre-flight: {len(reachable)} reachable, {len(unreachable)} unreachable ({elapsed:.1f}s).")
+    logging.info(f"📡 Pre-flight: {len(reachable)} reachable, {len(unreachable)} unreachable")
+    for ip in unreachable:
+        logging.info(f"📡 {ip} unreachable on port {(ports or {}).get(ip, port)}")
+    return reachable, unreachable
+
+
+def main():
+    """Command line sweep of a CSV file of IPs; prints the unreachable ones."""
+    # Imported here: engine itself imports this module
+    from engine import read_csv
+
+    parser = argparse.ArgumentParser(description="Check which switches answer on the SSH port.")
+    parser.add_argument("file_csv", help="CSV file with one IP per line")
+    parser.add_argument("--port", type=int, default=22)
+    parser.add_argument("--timeout", type=float, default=3, help="Seconds per device (default: 3)")
+    parser.add_argument("--concurrency", type=int, default=500, help="Connections in flight (default: 500)")
+    args = parser.parse_args()
+
+    _, unreachable = sweep(read_csv(args.file_csv), port=args.port, timeout=args.timeout,
+                           max_concurrency=args.concurrency)
+    for ip in unreachable:
+        print(f"⛔ {ip}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+######################################################
+#        NETMIKO SESSION POOL (REUSE PER RUN)        #
+######################################################
+
+import logging
+import threading
+import time
+
+from engine import connect
+
+
+class SessionPool:
+    """Keeps netmiko sessions open between the steps of a run.
+
+    Sessions are keyed by (host, device_type, username). A released session
+    is kept idle and handed back by the next acquire() on the same key after
+    a health check, so a "backup, push, backup" workflow logs in once per
+    device. SSH keepalives are sent every `keepalive` seconds and sessions
+    idle for more than `idle_timeout` seconds are closed.
+
+        with SessionPool() as pool:
+            run_devices(ip_list, task, username, password, pool=pool)
+            run_devices(ip_list, other_task, username, password, pool=pool)
+    """
+
+    def __init__(self, idle_timeout=300, keepalive=30):
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.opened = 0
+        self.reused = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._reaper = threading.Thread(target=self._reap, name="SessionPoolReaper", daemon=True)
+        self._reaper.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close_all()
+
+    @staticmethod
+    def _key(connection):
+        return (connection.host, connection.device_type, connection.username)
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.disconnect()
+        except Exception as e:
+            logging.warning(f"⚠️ Error while closing the session to {connection.host}: {e}")
+
+    def acquire(self, ip, username, password, device_type="aruba_osswitch", timeout=30, port=22):
+        """Returns a live session to the device, reusing an idle one when possible."""
+        key = (ip, device_type, username)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                connection, last_used = idle.pop() if idle else (None, 0)
+
+            if connection is None:
+                break
+            # Health check outside the lock, it talks to the device
+            if time.monotonic() - last_used <= self.idle_timeout and connection.is_alive():
+                with self._lock:
+                    self.reused += 1
+                logging.info(f"♻️ Reusing session to {ip}")
+                return connection
+            self._close(connection)
+
+        connection = connect(ip, username, password, device_type=device_type, timeout=timeout,
+                             keepalive=self.keepalive, port=port)
+        with self._lock:
+            self.opened += 1
+        return connection
+
+    def release(self, connection, healthy=True):
+        """Gives a session back to the pool; unhealthy sessions are closed."""
+        if not healthy or self._closed.is_set():
+            self._close(connection)
+            return
+        with self._lock:
+            self._idle.setdefault(self._key(connection), []).append((connection, time.monotonic()))
+
+    def evict_idle(self):
+        """Closes the sessions idle for more than idle_timeout."""
+        limit = time.monotonic() - self.idle_timeout
+        expired = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                expired += [connection for connection, last_used in idle if last_used < limit]
+                idle[:] = [(connection, last_used) for connection, last_used in idle if last_used >= limit]
+        for connection in expired:
+            logging.info(f"💤 Closing idle session to {connection.host}")
+            self._close(connection)
+
+    def close_all(self):
+        """Closes every idle session and stops the reaper thread."""
+        self._closed.set()
+        with self._lock:
+            connections = [connection for idle in self._idle.values() for connection, _ in idle]
+            self._idle.clear()
+        for connection in connections:
+            self._close(connection)
+        if self.opened:
+            print(f"♻️  Sessions: {self.opened} opened, {self.reused} reused.")
+            logging.info(f"♻️ Sessions: {self.opened} opened, {self.reused} reused")
+
+    def _reap(self):
+        while not self._closed.wait(min(self.idle_timeout, 60)):
+            self.evict_idle()
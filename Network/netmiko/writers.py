@@ -0,0 +1,154 @@
+######################################################
+#       BATCHED RECORD WRITER (CSV / JSONL / PARQUET) #
+######################################################
+
+import csv
+import json
+import os
+import queue
+import threading
+
+# Parquet output needs the optional "pyarrow" package
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+_STOP = object()
+
+
+class BatchWriter:
+    """Single writer thread fed by many workers through a queue.
+
+    The output file is opened once per run and records are written in
+    batches, so rows from concurrent workers can never interleave.
+    schema is an ordered list of (column, type) pairs, type being "string",
+    "int" or "float".
+
+        with BatchWriter("out.csv", schema) as writer:
+            writer.put({"IP Address": "10.0.0.1", ...})
+    """
+
+    def __init__(self, path, schema, fmt="csv", batch_size=100, flush_interval=2.0):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}")
+        if fmt == "parquet" and pyarrow is None:
+            raise RuntimeError("Parquet output needs the 'pyarrow' package (pip install pyarrow)")
+
+        self.path = path
+        self.schema = schema
+        self.columns = [column for column, _ in schema]
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="BatchWriter", daemon=True)
+        self._error = None
+        self._stopped = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._thread.start()
+
+    def put(self, record):
+        """Queues a record (dict keyed by column name); missing columns are left empty."""
+        if self._error:
+            raise self._error
+        self._queue.put(record)
+
+    def close(self):
+        """Flushes pending records and waits for the writer thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._error:
+            raise self._error
+
+    def _convert(self, value, kind):
+        if value is None or value == "":
+            return None
+        if kind == "int":
+            return int(value)
+        if kind == "float":
+            return float(value)
+        return str(value)
+
+    def _run(self):
+        try:
+            if self.fmt == "csv":
+                self._run_csv()
+            elif self.fmt == "jsonl":
+                self._run_jsonl()
+            else:
+                self._run_parquet()
+        except Exception as e:
+            self._error = e
+            # Drain the queue so close() never blocks on a dead writer
+            while not self._stopped and self._queue.get() is not _STOP:
+                pass
+
+    def _batches(self):
+        """Yields lists of records, cut by batch size or flush interval."""
+        batch = []
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                self._stopped = True
+                if batch:
+                    yield batch
+                return
+            if record is not None:
+                batch.append(record)
+            if batch and (record is None or len(batch) >= self.batch_size):
+                yield batch
+                batch = []
+
+    def _run_csv(self):
+        with open(self.path, mode="w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(self.columns)
+            for batch in self._batches():
+                writer.writerows([record.get(column, "") for column in self.columns] for record in batch)
+                file.flush()
+                self.written += len(batch)
+
+    def _run_jsonl(self):
+        # The schema is stored next to the data so consumers know the column types
+        with open(f"{self.path}.schema.json", "w") as file:
+            json.dump([{"name": column, "type": kind} for column, kind in self.schema], file, indent=2)
+
+        with open(self.path, "w") as file:
+            for batch in self._batches():
+                for record in batch:
+                    row = {column: self._convert(record.get(column), kind) for column, kind in self.schema}
+                    file.write(json.dumps(row) + "\n")
+                file.flush()
+                self.written += len(batch)
+
+    def _run_parquet(self):
+        types = {"string": pyarrow.string(), "int": pyarrow.int64(), "float": pyarrow.float64()}
+        arrow_schema = pyarrow.schema([(column, types[kind]) for column, kind in self.schema])
+
+        # One row group per batch
+        with pyarrow.parquet.ParquetWriter(self.path, arrow_schema) as writer:
+            for batch in self._batches():
+                columns = {
+                    column: [self._convert(record.get(column), kind) for record in batch]
+                    for column, kind in self.schema
+                }
+                writer.write_table(pyarrow.table(columns, schema=arrow_schema))
+                self.written += len(batch)